@@ -0,0 +1,122 @@
+import glob
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import pandas as pd
+from atop_constants import *
+from atop_processes import AtopProcesses
+from atop_report import AtopReport
+from atopsar_parser import AtopsarError
+
+LOGGER = logging.getLogger()
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+# Batch processing of many atop files, e.g. the daily logs of a month (atop_YYYYMMDD).
+# Files are parsed in a pool of processes and merged in the order of their names, i.e. in the order of time.
+DEFAULT_MEMORY_LIMIT = 4 << 30  # bytes
+# rough upper estimate of the peak memory of a parse per byte of the atop file (its records are compressed)
+MEMORY_PER_BYTE = 8
+
+
+def get_files(path):
+    # directory with atop logs or a glob pattern
+    pattern = os.path.join(path, 'atop_*') if os.path.isdir(path) else path
+    files = sorted(f for f in glob.glob(pattern) if os.path.isfile(f))
+    if not files:
+        raise FileNotFoundError(f'No atop files found in {path}')
+    return files
+
+
+def map_files(function, files, workers=1, memory_limit=DEFAULT_MEMORY_LIMIT):
+    # Like Executor.map, yields function(file) in the order of files.
+    # A file is submitted only when the estimated memory of the files being parsed or waiting to be merged fits
+    # into memory_limit, so a slow file does not let the finished ones pile up. At least one file is always parsed.
+    if workers <= 1:
+        for f in files:
+            yield function(f)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()  # (future, estimate)
+        used = 0
+        for f in files:
+            estimate = os.path.getsize(f) * MEMORY_PER_BYTE
+            while pending and used + estimate > memory_limit:
+                future, e = pending.popleft()
+                yield future.result()
+                used -= e
+            pending.append((executor.submit(function, f), estimate))
+            used += estimate
+        while pending:
+            yield pending.popleft()[0].result()
+
+
+def parse_report(file):
+    # atopsar runs of a single file are sequential, files are parsed in parallel
+    try:
+        return AtopReport(file)
+    except AtopsarError as e:
+        LOGGER.critical(f'Skipping {file}: {e}')
+        return None
+
+
+def merge_reports(name, reports):
+    # one report with the resources and processes of all reports, in the order of time
+    frames = {}  # resource name: (resource, [data...], [data_opt...])
+    for report in reports:
+        for r in report.resources:
+            resource, data, data_opt = frames.setdefault(r.name, (r, [], []))
+            data.append(r.data)
+            if r.data_opt is not None:
+                data_opt.append(r.data_opt)
+    if not frames:
+        raise AtopsarError(f'Could not obtain any resource data from {name}')
+    result = AtopReport.__new__(AtopReport)  # nothing to parse
+    result.file = name
+    result.workers = 1
+    result.timeline = None
+    result.resources = []
+    for resource, data, data_opt in frames.values():
+        resource.data = concat(data)
+        resource.data_opt = concat(data_opt) if data_opt else None
+        result.resources.append(resource)
+    result.processes = AtopProcesses.concat([r.processes for r in reports])
+    return result
+
+
+def concat(frames):
+    return pd.concat(frames, ignore_index=True).sort_values(ATOP_TIMESTAMP, kind='stable', ignore_index=True)
+
+
+def load_report(path, workers=1, memory_limit=DEFAULT_MEMORY_LIMIT, cache=None):
+    # merged report of all atop files of path, see get_files
+    files = get_files(path)
+    LOGGER.info(f'Parsing {len(files)} atop files using {workers} processes')
+    reports = {f: cache.load(f) if cache else None for f in files}
+    missing = [f for f, report in reports.items() if report is None]
+    for f, report in zip(missing, map_files(parse_report, missing, workers, memory_limit)):
+        if report is not None and cache:
+            cache.store(f, report)
+        reports[f] = report
+    return merge_reports(path, [r for r in reports.values() if r is not None])
+
+
+def parse_processes(path, workers=1, memory_limit=DEFAULT_MEMORY_LIMIT, native=False):
+    # merged (processes, records) of all atop files of path, see get_files and process_info.parse
+    import process_info  # not needed for reports, it configures debug logging
+    files = get_files(path)
+    LOGGER.info(f'Parsing processes of {len(files)} atop files using {workers} processes')
+    parse = partial(parse_file_processes, native=native)
+    return process_info.merge(p for p in map_files(parse, files, workers, memory_limit) if p is not None)
+
+
+def parse_file_processes(file, native=False):
+    # like parse_report, a file atop fails on is skipped
+    import process_info
+    try:
+        return process_info.parse(file, native)
+    except process_info.ProcessParseError as e:
+        LOGGER.critical(f'Skipping {file}: {e}')
+        return None
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import report_format
+from atop_constants import PARSER_VERSION
+
+LOGGER = logging.getLogger()
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'atopvis')
+DEFAULT_CACHE_SIZE = 1 << 30  # bytes
+HASH_CHUNK_SIZE = 1 << 20  # bytes
+
+
+class AtopCache:
+    # On-disk cache of parsed reports, keyed by the content hash of the atop file and the parser version.
+    # To avoid hashing the file on every run, the hash is remembered together with the size and mtime of the file.
+    # Entries are evicted in LRU order (by their mtime, touched on every hit) once the cache exceeds max_size.
+    INDEX = 'index.json'
+    SUFFIX = '.report'
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, file):
+        # None if not cached, failures of the cache (e.g. an unwritable directory) only disable it
+        try:
+            path = self.__get_path(file)
+            if not report_format.is_report(path):
+                return None
+            try:
+                report = report_format.load(path)
+            except report_format.ReportFormatError as e:
+                LOGGER.warning(f'Removing corrupted cache entry {path}: {e}')
+                self.__remove(path)
+                return None
+            os.utime(path)  # mark as recently used
+        except OSError as e:
+            LOGGER.warning(f'Could not load {file} from cache {self.directory}: {e}')
+            return None
+        report.file = file  # the same content might have been cached under a different name
+        LOGGER.info(f'Report for {file} loaded from cache {path}')
+        return report
+
+    def store(self, file, report):
+        # The entry is written under a unique name and renamed into place, so a reader never sees a partial one.
+        # Entries are keyed by content, if another process stored the same one first, it is kept.
+        # A failure (e.g. a full disk) is only logged, the report is used without caching it.
+        tmp = None
+        try:
+            path = self.__get_path(file)
+            tmp = tempfile.mkdtemp(prefix=f'{os.path.basename(path)}.', suffix='.tmp', dir=self.directory)
+            report_format.save(report, tmp)
+            if os.path.isdir(path) and not report_format.is_report(path):
+                self.__remove(path)  # incomplete, e.g. left by an interrupted eviction
+            try:
+                os.rename(tmp, path)
+                tmp = None
+            except OSError:
+                pass  # stored by another process first
+            self.__evict()
+        except OSError as e:
+            LOGGER.warning(f'Could not store {file} to cache {self.directory}: {e}')
+        finally:
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    def get_key(self, file):
+        stat = os.stat(file)
+        identity = [stat.st_size, stat.st_mtime_ns]
+        index = self.__load_index()
+        name = os.path.abspath(file)
+        entry = index.get(name)
+        if entry is None or entry[:2] != identity:
+            entry = identity + [self.__hash(file)]
+            index[name] = entry
+            self.__store_index(index)
+        return f'{entry[2]}-v{PARSER_VERSION}'
+
+    def __get_path(self, file):
+        return os.path.join(self.directory, self.get_key(file) + self.SUFFIX)
+
+    @staticmethod
+    def __hash(file):
+        h = hashlib.blake2b(digest_size=20)
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def __load_index(self):
+        try:
+            with open(os.path.join(self.directory, self.INDEX)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def __store_index(self, index):
+        path = os.path.join(self.directory, self.INDEX)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def __remove(self, path):
+        # renamed first, so the entry disappears at once and a concurrent removal of the same entry fails here
+        trash = f'{path}.{os.getpid()}.{id(self)}.del'
+        try:
+            os.rename(path, trash)
+        except OSError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def __evict(self):
+        entries = []
+        for e in os.scandir(self.directory):
+            if e.name.endswith(self.SUFFIX):
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(e.path))
+                    entries.append((e.stat().st_mtime, size, e.path))
+                except FileNotFoundError:
+                    continue  # removed by another process
+        total = sum(e[1] for e in entries)
+        evicted = set()
+        # least recently used first
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            LOGGER.info(f'Evicting {path} from cache')
+            self.__remove(path)
+            evicted.add(os.path.basename(path)[:-len(self.SUFFIX)])
+            total -= size
+        self.__prune_index(evicted)
+
+    def __prune_index(self, evicted):
+        # forget the files which no longer exist and the ones whose entries were evicted
+        index = self.__load_index()
+        kept = {name: entry for name, entry in index.items()
+                if os.path.exists(name) and f'{entry[2]}-v{PARSER_VERSION}' not in evicted}
+        if len(kept) != len(index):
+            self.__store_index(kept)
+
+
+def open_cache(directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_CACHE_SIZE):
+    # None if the cache can't be used (e.g. directory is a file or not writable), parsing works without it
+    try:
+        return AtopCache(directory, max_size)
+    except OSError as e:
+        LOGGER.warning(f'Not caching parsed atop files, could not use {directory}: {e}')
+        return None
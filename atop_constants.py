@@ -1,5 +1,7 @@
 import sys
 ATOP_TIMESTAMP = 'timestamp'
+# bump whenever parsed data change, so that cached reports are not reused
+PARSER_VERSION = 4
 
 # since Python 3.6, dicts keep insertion order
 assert sys.version_info >= (3, 6)
@@ -1,20 +1,129 @@
+import numpy as np
+import pandas as pd
+
+# resources of the top processes, in the order of the tooltip
+RESOURCES = ['dsk', 'cpu', 'ram']
+COLUMNS = ['time', 'resource', 'rank', 'pid', 'command', 'util']
+CATEGORICAL = ['resource', 'command']
+TOP_COLUMNS = ['time', 'rank', 'pid', 'command', 'util']
+
+
+def parse_top(times, texts):
+    # rows of an atopsar top 3 processes report (time cut off) to a frame with TOP_COLUMNS
+    #   2345 python      99% |  1234 relion    12% |    12 atop       1%
+    columns = {c: [] for c in TOP_COLUMNS}
+    for time, text in zip(times, texts):
+        for rank, part in enumerate(text.split('|')):
+            tokens = part.split()
+            if len(tokens) < 3:
+                continue  # fewer active processes
+            try:
+                pid, util = int(tokens[0]), float(tokens[-1].rstrip('%'))
+            except ValueError:
+                continue
+            for c, v in zip(TOP_COLUMNS, (time, rank, pid, ' '.join(tokens[1:-1]), util)):
+                columns[c].append(v)
+    return pd.DataFrame(columns)
+
+
 class AtopProcess:
+    # top processes of all resources at a single time, rows are (resource, rank, pid, command, util)
     header = 'res    pid command  util |   pid command  util |   pid command  util'
 
-    def __init__(self, time, disk, cpu, memory):
+    def __init__(self, time, rows):
         self.time = time
-        self.disk = disk
-        self.cpu = cpu
-        self.memory = memory
+        self.rows = rows
+
+    def get_top(self, resource):
+        # [(pid, command, util)...] of a resource, the top one first
+        return [(pid, command, util) for r, _, pid, command, util in self.rows if r == resource]
 
     def __lt__(self, other):
         return self.time < other.time
 
     def __str__(self):
-        return '\n'.join([self.header,
-                          'dsk' + self.disk,
-                          'cpu' + self.cpu,
-                          'ram' + self.memory])
+        lines = [self.header]
+        for resource in RESOURCES:
+            top = ' |'.join(f'{pid:>6} {command:<7} {util:>4.0f}%' for pid, command, util in self.get_top(resource))
+            lines.append(f'{resource} {top}'.rstrip())
+        return '\n'.join(lines)
 
     def __repr__(self):
         return str(self)
+
+
+class AtopProcesses:
+    # Top processes of each resource in all samples, one row per process: time (epoch), resource, rank (0 is the
+    # top one), pid, command and util (%).
+    # Rows are sorted by time, so the processes at a time or in an interval are found by bisection. Resources and
+    # commands are categorical, i.e. stored and compared as small integer codes.
+    def __init__(self, data=None):
+        df = pd.DataFrame(data if data is not None else {c: [] for c in COLUMNS}, columns=COLUMNS)
+        df = df.astype({'time': np.int64, 'rank': np.int8, 'pid': np.int32, 'util': np.float32})
+        df['resource'] = pd.Categorical(df['resource'], categories=RESOURCES)
+        df['command'] = df['command'].astype(str).astype('category')
+        self.data = df.sort_values(['time', 'resource', 'rank'], kind='stable', ignore_index=True)
+        self.__times = self.data['time'].to_numpy()
+
+    @staticmethod
+    def from_codes(columns, categories):
+        # columns of a table already sorted and typed (e.g. memory mapped from a report), with the codes of the
+        # categorical columns and their categories, nothing is converted or sorted
+        data = {c: pd.Categorical.from_codes(columns[c], categories[c]) if c in CATEGORICAL else columns[c]
+                for c in COLUMNS}
+        result = AtopProcesses.__new__(AtopProcesses)
+        result.data = pd.DataFrame(data, copy=False)
+        result.__times = result.data['time'].to_numpy()
+        return result
+
+    def to_codes(self):
+        # inverse of from_codes
+        columns = {c: self.data[c].cat.codes if c in CATEGORICAL else self.data[c] for c in COLUMNS}
+        return pd.DataFrame(columns), {c: self.data[c].cat.categories.to_numpy() for c in CATEGORICAL}
+
+    @staticmethod
+    def from_top(tops):
+        # tops: {resource: frame with TOP_COLUMNS (see parse_top) or None}
+        frames = [df.assign(resource=resource) for resource, df in tops.items() if df is not None and len(df)]
+        return AtopProcesses(pd.concat(frames, ignore_index=True) if frames else None)
+
+    @staticmethod
+    def concat(parts):
+        # processes of several reports, for a time present in more of them the first report is kept
+        frames = [p.data.assign(part=i) for i, p in enumerate(parts) if len(p)]
+        if not frames:
+            return AtopProcesses()
+        df = pd.concat(frames, ignore_index=True)
+        first = df.groupby('time')['part'].transform('min')
+        return AtopProcesses(df[df['part'] == first][COLUMNS])
+
+    def __len__(self):
+        return len(self.data)
+
+    def get_times(self):
+        # distinct times, sorted
+        return np.unique(self.__times)
+
+    def between(self, begin, end):
+        # rows with begin <= time <= end
+        i = np.searchsorted(self.__times, begin, 'left')
+        j = np.searchsorted(self.__times, end, 'right')
+        return self.data.iloc[i:j]
+
+    def get(self, time):
+        df = self.between(time, time)
+        return AtopProcess(time, list(zip(df['resource'], df['rank'], df['pid'], df['command'], df['util'])))
+
+    def get_top(self, resource, begin=None, end=None):
+        # the top process of a resource in each sample (of an interval), e.g. the top cpu consumers of a spike
+        df = self.data
+        if begin is not None or end is not None:
+            df = self.between(-np.inf if begin is None else begin, np.inf if end is None else end)
+        return df[(df['resource'] == resource) & (df['rank'] == 0)]
+
+    def get_command(self, command):
+        # all rows of a command, in the order of time
+        categories = self.data['command'].cat.categories
+        if command not in categories:
+            return self.data.iloc[:0]
+        return self.data[self.data['command'].cat.codes == categories.get_loc(command)]
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# Per stage instrumentation: wall time, CPU time of the thread running the stage, rows processed and peak memory.
+# Stages are coarse (an atopsar run, building a DataFrame, writing a file...), so the measurement costs a few
+# system calls per stage. Stages are measured and kept only once start is called, a long running process (e.g.
+# following an atop file) which is not profiled collects nothing. The collected stages are written by write.
+# Peak memory is the maximal resident set size of the process so far, and with tracemalloc also the peak of the
+# memory allocated by Python during the stage (shared by stages running concurrently in threads).
+MB = 1 << 20
+STAGES = []
+ENABLED = False  # see start
+START = time.perf_counter()
+PROFILER = None  # cProfile.Profile, see start
+
+
+class Stage:
+    __slots__ = ('name', 'rows', 'values')
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows  # can be set while the stage runs
+        self.values = {}  # any other values to report
+
+
+def get_max_rss():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / MB if sys.platform == 'darwin' else usage / 1024  # bytes on macOS, kB elsewhere
+
+
+def record(name, wall, cpu=None, rows=None, **values):
+    result = {'name': name, 'thread': threading.current_thread().name, 'wall_s': wall, 'cpu_s': cpu, 'rows': rows,
+              'max_rss_mb': get_max_rss()}
+    if tracemalloc.is_tracing():
+        result['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / MB
+    result.update(values)
+    if ENABLED:
+        STAGES.append(result)  # atomic, stages of several threads can be recorded at once
+    return result
+
+
+@contextmanager
+def stage(name, rows=None):
+    s = Stage(name, rows)
+    if not ENABLED:
+        yield s
+        return
+    if tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+        tracemalloc.reset_peak()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield s
+    finally:
+        record(name, time.perf_counter() - wall, time.thread_time() - cpu, s.rows, **s.values)
+
+
+def start(cprofile=False, trace_memory=False):
+    # collect the stages, with optional, more expensive captures
+    global PROFILER, ENABLED
+    ENABLED = True
+    if trace_memory:
+        tracemalloc.start()
+    if cprofile:
+        import cProfile
+        PROFILER = cProfile.Profile()
+        PROFILER.enable()
+
+
+def write(path, top=20):
+    # JSON report of all stages, with the top functions (cProfile) and allocations (tracemalloc) if captured
+    report = {'command': sys.argv, 'pid': os.getpid(), 'wall_s': time.perf_counter() - START,
+              'cpu_s': time.process_time(), 'max_rss_mb': get_max_rss(), 'stages': STAGES}
+    if PROFILER is not None:
+        import io
+        import pstats
+        PROFILER.disable()
+        PROFILER.dump_stats(f'{path}.prof')
+        out = io.StringIO()
+        pstats.Stats(PROFILER, stream=out).sort_stats('cumulative').print_stats(top)
+        report['cprofile'] = {'stats': f'{path}.prof', 'top': out.getvalue().splitlines()}
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+        report['tracemalloc'] = {'peak_mb': tracemalloc.get_traced_memory()[1] / MB,
+                                 'allocated_at_end': [str(s) for s in snapshot.statistics('lineno')[:top]]}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
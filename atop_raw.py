@@ -0,0 +1,126 @@
+import struct
+import zlib
+import numpy as np
+
+# Reader of the raw atop log (atop -w), without running atop.
+# The file starts with a rawheader, followed by samples: a rawrecord, the zlib compressed sstat (system level
+# counters) and the zlib compressed tstat of each task that was active in the interval.
+# The container is described by the lengths in the header, but the layout of struct tstat differs between atop
+# versions. It is decoded only if its layout is known for the version which wrote the file and its size matches
+# tstatlen of the header, otherwise RawFormatError is raised and atop has to be used instead.
+# Only the process data is decoded. struct sstat (cpu, memory, disks, gpus...) could be guarded the same way by
+# sstatlen, but no layout of it is known here yet, so the system level resources of main.py still come from atopsar.
+MAGIC = 0xfeedbeef
+# magic, aversion, future1, future2, rawheadlen, rawreclen, hertz, sfuture[6], sstatlen, tstatlen, utsname,
+# cfuture[8], pagesize, supportflags, osrel, osvers, ossub, ifuture[6]
+HEADER = '{}IHHHHHH12xII390s8s2xIiiii24x'
+# curtime, flags, sfuture[3], scomplen, pcomplen, interval, ndeviat, nactproc, ntask, totproc, totrun, totslpi,
+# totslpu, totzomb, nexit, noverflow, ifuture[6]
+RECORD = '{}qH6x13I24x4x'
+
+
+class RawFormatError(Exception):
+    pass
+
+
+def get_dtype(structs):
+    # C layout (with padding) of nested structs: [(name, [(field, type)...])...]
+    return np.dtype([(name, np.dtype(fields, align=True)) for name, fields in structs], align=True)
+
+
+# struct tstat of photoproc.h, by atop version (major, minor)
+TSTAT_2_7 = [
+    ('gen', [('tgid', 'i4'), ('pid', 'i4'), ('ppid', 'i4'), ('ruid', 'i4'), ('euid', 'i4'), ('suid', 'i4'),
+             ('fsuid', 'i4'), ('rgid', 'i4'), ('egid', 'i4'), ('sgid', 'i4'), ('fsgid', 'i4'), ('nthr', 'i4'),
+             ('name', 'S16'), ('isproc', 'i1'), ('state', 'S1'), ('excode', 'i4'), ('btime', 'i8'),
+             ('elaps', 'i8'), ('cmdline', 'S256'), ('nthrslpi', 'i4'), ('nthrslpu', 'i4'), ('nthrrun', 'i4'),
+             ('ctid', 'i4'), ('vpid', 'i4'), ('wasinactive', 'i4'), ('container', 'S16')]),
+    ('cpu', [('utime', 'u8'), ('stime', 'u8'), ('nice', 'i4'), ('prio', 'i4'), ('rtprio', 'i4'),
+             ('policy', 'i4'), ('curcpu', 'i4'), ('sleepavg', 'i4'), ('ifuture', 'i4', 4), ('wchan', 'S16'),
+             ('rundelay', 'u8'), ('cfuture', 'u8', 1)]),
+    ('dsk', [('rio', 'u8'), ('rsz', 'u8'), ('wio', 'u8'), ('wsz', 'u8'), ('cwsz', 'u8'), ('cfuture', 'u8', 4)]),
+    ('mem', [('minflt', 'u8'), ('majflt', 'u8'), ('vexec', 'u8'), ('vmem', 'u8'), ('rmem', 'u8'), ('pmem', 'u8'),
+             ('vgrow', 'i8'), ('rgrow', 'i8'), ('vdata', 'u8'), ('vstack', 'u8'), ('vlibs', 'u8'),
+             ('vswap', 'u8'), ('vlock', 'u8'), ('cfuture', 'u8', 3)]),
+    ('net', [('tcpsnd', 'u8'), ('tcpssz', 'u8'), ('tcprcv', 'u8'), ('tcprsz', 'u8'), ('udpsnd', 'u8'),
+             ('udpssz', 'u8'), ('udprcv', 'u8'), ('udprsz', 'u8'), ('avail1', 'u8'), ('avail2', 'u8'),
+             ('cfuture', 'u8', 4)]),
+    ('gpu', [('state', 'S1'), ('cfuture', 'S3'), ('nrgpus', 'i2'), ('gpulist', 'i4'), ('gpubusy', 'i4'),
+             ('membusy', 'i4'), ('timems', 'u8'), ('memnow', 'u8'), ('memcum', 'u8'), ('sample', 'u8')]),
+]
+TSTAT_LAYOUTS = {(2, 7): TSTAT_2_7}
+
+
+def get_version(aversion):
+    # the most significant bit marks the version number
+    return (aversion & 0x7fff) >> 8, aversion & 0xff
+
+
+class RawRecord:
+    __slots__ = ('curtime', 'flags', 'interval', 'ndeviat', 'nactproc', 'ntask', 'totproc', 'nexit', 'sstat',
+                 'tstat', 'raw')
+
+    def __init__(self, raw, values, sstat, tstat):
+        (self.curtime, self.flags, _, _, self.interval, self.ndeviat, self.nactproc, self.ntask, self.totproc,
+         _, _, _, _, self.nexit, _) = values
+        self.raw = raw
+        self.sstat = sstat  # compressed
+        self.tstat = tstat  # compressed
+
+    def get_tasks(self):
+        # structured array of the tasks of this sample, see TSTAT_LAYOUTS
+        dtype = self.raw.get_tstat_dtype()
+        data = zlib.decompress(self.tstat)
+        if len(data) != self.ndeviat * self.raw.tstatlen:
+            raise RawFormatError(f'Corrupted process data of sample {self.curtime}')
+        return np.frombuffer(data, dtype=dtype)
+
+
+class RawFile:
+    def __init__(self, file):
+        self.file = file
+        with open(file, 'rb') as f:
+            data = f.read(struct.calcsize(HEADER.format('<')))
+        self.order = self.__get_order(data)
+        values = struct.unpack(HEADER.format(self.order), data)
+        (_, aversion, _, _, self.rawheadlen, self.rawreclen, self.hertz, self.sstatlen, self.tstatlen,
+         utsname, _, self.pagesize, self.supportflags, _, _, _) = values
+        self.version = get_version(aversion)
+        self.version_str = '.'.join(str(v) for v in self.version)
+        self.host = utsname[65:130].split(b'\0', 1)[0].decode('utf-8', 'replace')  # nodename
+        self.record = struct.Struct(RECORD.format(self.order))
+        if self.rawheadlen != len(data) or self.rawreclen != self.record.size:
+            raise RawFormatError(f'{file} has unsupported header or record length of atop {self.version_str}')
+        self.tstat_dtype = None
+        layout = TSTAT_LAYOUTS.get(self.version)
+        if layout is not None:
+            dtype = get_dtype(layout).newbyteorder(self.order)
+            if dtype.itemsize == self.tstatlen:
+                self.tstat_dtype = dtype
+
+    def get_tstat_dtype(self):
+        if self.tstat_dtype is None:
+            raise RawFormatError(f'{self.file}: unknown layout of the process data of atop {self.version_str}')
+        return self.tstat_dtype
+
+    def __get_order(self, data):
+        for order in '<>':
+            if len(data) >= 4 and struct.unpack(f'{order}I', data[:4])[0] == MAGIC:
+                return order
+        raise RawFormatError(f'{self.file} is not a raw atop file')
+
+    def records(self):
+        # all complete samples, a sample still being written is ignored
+        with open(self.file, 'rb') as f:
+            f.seek(self.rawheadlen)
+            while True:
+                data = f.read(self.rawreclen)
+                if len(data) < self.rawreclen:
+                    return
+                values = self.record.unpack(data)
+                scomplen, pcomplen = values[2], values[3]
+                sstat = f.read(scomplen)
+                tstat = f.read(pcomplen)
+                if len(sstat) < scomplen or len(tstat) < pcomplen:
+                    return
+                yield RawRecord(self, values, sstat, tstat)
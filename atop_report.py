@@ -1,19 +1,97 @@
+import atop_profile
 import atop_resource
-from atopsar_parser import AtopsarParser
+import atop_time
+from atop_processes import AtopProcesses
+from atopsar_parser import AtopsarParser, AtopsarError
+from atop_constants import *
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import sys
+import pandas as pd
 
 LOGGER = logging.getLogger()
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
 
 class AtopReport:
-    def __init__(self, file):
+    def __init__(self, file, workers=1, begin=None):
         self.file = file
+        self.workers = max(1, workers)
         self.resources = []
-        self.resources.append(AtopsarParser.parse_cpu(file))
-        self.resources.append(AtopsarParser.parse_memory(file))
-        self.resources.extend(AtopsarParser.parse_drives(file))
-        self.resources.extend(AtopsarParser.parse_gpus(file))
-        self.processes = AtopsarParser.parse_processes(file)
+        self.processes = AtopProcesses()
         self.timeline = None
+        with atop_profile.stage('atop report') as s:
+            self.__extract(self.workers, begin)
+            s.rows = sum(len(r.data) for r in self.resources)
+
+    def __extract(self, workers, begin):
+        # The reports are split into workers groups, each one read by a single atopsar run, so with one worker the
+        # raw file is read once. A report missing in the output is retried in its own atopsar run by its task.
+        # The work is done by the atopsar processes, so threads are enough to keep them all busy.
+        flags = AtopsarParser.get_report_flags()
+        groups = [flags[i::workers] for i in range(min(workers, len(flags)))]
+        resources = [('cpu', AtopsarParser.parse_cpu),
+                     ('memory', AtopsarParser.parse_memory),
+                     ('drives', AtopsarParser.parse_drives),
+                     ('gpus', AtopsarParser.parse_gpus)]
+        processes = list(AtopsarParser.PROCESS_REPORTS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            reports = {}
+            for group in executor.map(lambda g: AtopsarParser.parse_reports(self.file, begin, g), groups):
+                reports.update(group)
+            # submit everything first, then collect in the original order to keep the report deterministic
+            resource_futures = [(n, executor.submit(f, self.file, begin, reports)) for n, f in resources]
+            process_futures = [(n, executor.submit(AtopsarParser.parse_top_processes, self.file, n, begin, reports))
+                               for n in processes]
+            for name, future in resource_futures:
+                result = self.__get_result(name, future)
+                if isinstance(result, list):
+                    self.resources.extend(result)
+                elif result is not None:
+                    self.resources.append(result)
+            process_data = {n: self.__get_result(f'{n} processes', f) for n, f in process_futures}
+        self.processes = AtopsarParser.merge_processes(process_data['disk'], process_data['cpu'],
+                                                       process_data['memory'])
+        if not self.resources:
+            raise AtopsarError(f'Could not obtain any resource data from {self.file}')
+
+    @staticmethod
+    def __get_result(name, future):
+        try:
+            return future.result()
+        except AtopsarError as e:
+            LOGGER.critical(f'Skipping {name}: {e}')
+            return None
+
+    def update(self):
+        # Extract only the samples after the last one in the report and append them, e.g. while atop is still
+        # writing the file. atopsar selects samples with a minute precision, the overlap is filtered out.
+        # The newest sample of all resources is the begin, a resource which stopped reporting (e.g. an unplugged
+        # drive) must not make each update read the file again since its last sample.
+        last = {r.name: r.data[ATOP_TIMESTAMP].max() for r in self.resources}
+        # with the date, a time alone is resolved against the first day of the file (wrong after midnight)
+        begin = atop_time.format_time(max(last.values()), '%Y%m%d%H%M')
+        try:
+            new = AtopReport(self.file, self.workers, begin)
+        except AtopsarError as e:
+            LOGGER.debug(f'No new data in {self.file}: {e}')
+            return False
+        updated = False
+        resources = {r.name: r for r in self.resources}
+        for r in new.resources:
+            old = resources.get(r.name)
+            if old is None:
+                # e.g. a new drive, it has no history
+                self.resources.append(r)
+                updated = True
+                continue
+            data = r.data[r.data[ATOP_TIMESTAMP] > last[r.name]]
+            if data.empty:
+                continue
+            old.data = pd.concat([old.data, data], ignore_index=True)
+            if old.data_opt is not None and r.data_opt is not None:
+                data_opt = r.data_opt[r.data_opt[ATOP_TIMESTAMP] > old.data_opt[ATOP_TIMESTAMP].max()]
+                old.data_opt = pd.concat([old.data_opt, data_opt], ignore_index=True)
+            updated = True
+        self.processes = AtopProcesses.concat([self.processes, new.processes])
+        return updated
@@ -0,0 +1,76 @@
+import subprocess
+import logging
+import time
+
+LOGGER = logging.getLogger()
+
+CHUNK_SIZE = 1 << 20  # bytes read from the pipe at once
+
+
+# runs a command and yields its non-empty output lines while the command is still running,
+# so only a single chunk of the output is kept in memory at any time.
+# Use as a context manager: the command is killed when the stream is left before the output is exhausted.
+class AtopStream:
+    def __init__(self, cmd, chunk_size=CHUNK_SIZE):
+        self.cmd = cmd
+        self.chunk_size = chunk_size
+        self.returncode = None
+        self.last_line = ''
+        self.lines = 0  # lines read, including the empty ones
+        self.wait_time = 0  # seconds spent waiting for the output of the command
+        self.__process = None
+
+    @property
+    def success(self):
+        return 0 == self.returncode
+
+    def __enter__(self):
+        self.__process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        p = self.__process
+        if p.poll() is None:
+            p.kill()
+        p.stdout.close()
+        self.returncode = p.wait()
+
+    def __iter__(self):
+        p = self.__process
+        rest = b''
+        while True:
+            start = time.perf_counter()
+            chunk = p.stdout.read1(self.chunk_size)
+            self.wait_time += time.perf_counter() - start
+            if not chunk:
+                break
+            # keep the incomplete last line for the next chunk
+            cut = chunk.rfind(b'\n')
+            if cut < 0:
+                rest += chunk
+                continue
+            yield from self.__decode(rest + chunk[:cut])
+            rest = chunk[cut + 1:]
+        if rest:
+            yield from self.__decode(rest)
+        self.returncode = p.wait()
+
+    def __decode(self, data):
+        try:
+            lines = data.decode('utf-8').split('\n')
+        except UnicodeError:
+            lines = list(self.__decode_lines(data))
+        self.lines += len(lines)
+        for line in lines:
+            if line:
+                self.last_line = line
+                yield line
+
+    @staticmethod
+    def __decode_lines(data):
+        # slow path, skip just the lines which cannot be decoded
+        for line in data.split(b'\n'):
+            try:
+                yield line.decode('utf-8')
+            except UnicodeError as e:
+                LOGGER.error(f'Error parsing line. Line will be skipped: {line}\nReason: {e}')
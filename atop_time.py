@@ -0,0 +1,40 @@
+import time
+import numpy as np
+
+# Timestamps are int64 seconds since the epoch everywhere. atopsar and Scipion print local (wall clock) time,
+# and the plots show local time again, so only these conversions need to know about the timezone.
+# UTC offsets change only at whole quarters of an hour, so the offset is resolved once per distinct quarter
+# instead of once per sample.
+QUARTER = 900  # seconds
+DAY = 86400  # seconds
+
+
+def get_offsets(seconds, get_offset):
+    quarters, inverse = np.unique(np.floor_divide(seconds, QUARTER).astype(np.int64), return_inverse=True)
+    offsets = np.array([get_offset(int(q) * QUARTER) for q in quarters], dtype=np.int64)
+    return offsets[inverse].reshape(np.shape(seconds))
+
+
+def local_to_epoch(local):
+    # local: seconds since 1970-01-01 00:00 of the local wall clock
+    local = np.asarray(local)
+    if not local.size:
+        return local.astype(np.int64)
+    return local - get_offsets(local, lambda t: t - int(time.mktime(time.gmtime(t)[:8] + (-1,))))
+
+
+def epoch_to_local(epoch):
+    # inverse of local_to_epoch
+    epoch = np.asarray(epoch)
+    if not epoch.size:
+        return epoch.astype(np.int64)
+    return epoch + get_offsets(epoch, lambda t: time.localtime(t).tm_gmtoff)
+
+
+def day_to_local(year, month, day):
+    # local midnight of the given day, see local_to_epoch
+    return int(np.datetime64(f'{year:04}-{month:02}-{day:02}', 's').astype(np.int64))
+
+
+def format_time(epoch, fmt='%H:%M:%S'):
+    return time.strftime(fmt, time.localtime(epoch))
@@ -1,173 +1,356 @@
 from atop_resource import AtopResource
-from atop_processes import AtopProcess
-import subprocess
+from atop_processes import AtopProcesses, parse_top
+from atop_stream import AtopStream
+from datetime import date
+from operator import itemgetter
 import logging
+import re
 import sys
+import numpy as np
 import pandas as pd
+import atop_profile
+import atop_time
 from atop_constants import *
 
 
 LOGGER = logging.getLogger()
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
+TIME_RE = re.compile(r"^\d{2}:\d{2}:\d{2}$")
+DATE_RE = re.compile(r"analysis date: (\d{4})/(\d{2})/(\d{2})")
+
+
+class AtopsarError(Exception):
+    pass
+
+
+def get_day(line):
+    # local midnight of the analysis date line, today if there is none
+    # -------------------------- analysis date: 2020/12/02 --------------------------
+    match = DATE_RE.search(line)
+    if match is None:
+        today = date.today()
+        return atop_time.day_to_local(today.year, today.month, today.day)
+    return atop_time.day_to_local(*(int(g) for g in match.groups()))
+
+
+def to_epoch(day, times):
+    # HH:MM:SS of consecutive samples to epoch, the day changes whenever the time goes back (after midnight)
+    if not len(times):
+        return np.array([], dtype=np.int64)
+    # seconds of the day, digit by digit
+    digits = np.array(times, dtype='S8').view(np.uint8).reshape(-1, 8).astype(np.int64) - ord('0')
+    seconds = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60 \
+        + digits[:, 6] * 10 + digits[:, 7]
+    days = np.concatenate([[0], np.cumsum(np.diff(seconds) < 0)])
+    return atop_time.local_to_epoch(day + days * atop_time.DAY + seconds)
+
+
+class AtopsarTable:
+    # Collects the selected columns of an atopsar report row by row and converts them to typed numpy arrays
+    # in chunks, so the tokens of at most CHUNK_ROWS rows are kept as Python strings at any time.
+    # Columns with a unit (possibly empty) are numeric, the unit suffix (e.g. '%' or 'M') is stripped.
+    CHUNK_ROWS = 1 << 16
+
+    def __init__(self, headers, cols, units, day):
+        self.cols = cols
+        self.units = units
+        indices = [headers.index(c) for c in cols]
+        self.getter = itemgetter(*indices) if len(indices) > 1 else lambda tokens: (tokens[indices[0]],)
+        self.min_tokens = max(indices) + 1
+        self.day = day  # local midnight of the first sample
+        self.times = [headers[0]]  # distinct timestamps
+        self.row_times = []  # per row index to self.times
+        self.values = []  # selected tokens of the current chunk, row after row
+        self.chunks = []
+
+    def add_line(self, line):
+        tokens = line.split()
+        if TIME_RE.match(tokens[0]):
+            self.times.append(tokens[0])
+        else:
+            tokens.insert(0, None)  # same time as the previous line
+        if len(tokens) >= self.min_tokens:  # in case of missing records
+            self.row_times.append(len(self.times) - 1)
+            self.values.extend(self.getter(tokens))
+            if len(self.values) >= self.CHUNK_ROWS * len(self.cols):
+                self.__flush()
+
+    def __flush(self):
+        if self.values:
+            table = np.array(self.values, dtype=str).reshape(-1, len(self.cols))
+            self.chunks.append([self.__convert(c, table[:, i]) for i, c in enumerate(self.cols)])
+            self.values = []
+
+    def __convert(self, col, values):
+        unit = self.units.get(col)
+        if unit is None:
+            return values
+        if unit:
+            values = np.char.rstrip(values, unit)
+        try:
+            return values.astype(np.int64)
+        except ValueError:
+            return values.astype(np.float64)
+
+    def to_columns(self):
+        self.__flush()
+        result = {c: np.concatenate([chunk[i] for chunk in self.chunks]) if self.chunks else np.array([])
+                  for i, c in enumerate(self.cols)}
+        result[ATOP_TIMESTAMP] = to_epoch(self.day, self.times)[np.array(self.row_times, dtype=np.int64)]
+        return result
+
+
+class AtopsarTopTable:
+    # Collects the rows of a top 3 processes report, see AtopsarParser.PROCESS_REPORTS
+    def __init__(self, day):
+        self.day = day  # local midnight of the first sample
+        self.times = []
+        self.texts = []
+
+    def add_line(self, line):
+        # first 8 characters are time, the rest is the line
+        self.times.append(line[:8])
+        self.texts.append(line[8:])
+
+    def to_frame(self):
+        # see atop_processes.parse_top
+        return parse_top(to_epoch(self.day, self.times).tolist(), self.texts)
+
 
 class AtopsarParser:
+    # atopsar flags: (marker at the end of the header line, description, columns, units of numeric columns)
+    GENERAL_REPORTS = {'-c': ('_cpu_', 'cpu', ['cpu', '%usr', '%sys', '%idle'], {'%usr': '', '%sys': '', '%idle': ''}),
+                       '-m': ('_mem_', 'memory', ['memtotal', 'memfree', 'cached', 'buffers', 'swptotal', 'swpfree'],
+                              {'memtotal': 'M', 'memfree': 'M', 'cached': 'M', 'buffers': 'M', 'swptotal': 'M',
+                               'swpfree': 'M'}),
+                       '-d': ('_dsk_', 'hdd', ['disk', 'busy', 'read/s', 'KB/read', 'writ/s', 'KB/writ'],
+                              {'busy': '%', 'read/s': '', 'KB/read': '', 'writ/s': '', 'KB/writ': ''}),
+                       '-g': ('_gpu_', 'gpu', ['gpubusy', 'membusy', 'memocc', 'busaddr', 'gputype'],
+                              {'gpubusy': '%', 'membusy': '%', 'memocc': '%'})}
+    # resource: (atopsar flags, description, marker at the end of the header line)
+    PROCESS_REPORTS = {'disk': ('-D', 'disk processes', 'dsk%_top3_'),
+                       'cpu': ('-O', 'cpu processes', 'cpu%_top3_'),
+                       'memory': ('-G', 'memory processes', 'mem%_top3_')}
+
     @staticmethod
-    def __run(cmd):
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-        log = []
-        while True:
-            output = p.stdout.readline().decode("utf-8").rstrip('\n')
-            if output == '' and p.poll() is not None:
-                break
-            if '' == output:
+    def __get_command(file, flags, begin):
+        # begin ([YYYYMMDD]hhmm) limits the report to the samples since then
+        return f'atopsar {flags} -r {file}' + (f' -b {begin}' if begin else '')
+
+    @staticmethod
+    def get_report_flags():
+        # flags of all reports of parse_reports
+        return list(AtopsarParser.GENERAL_REPORTS) + [v[0] for v in AtopsarParser.PROCESS_REPORTS.values()]
+
+    @staticmethod
+    def parse_reports(file, begin=None, flags=None):
+        # The reports of the given flags (all by default) in a single atopsar run, i.e. the raw file is read once
+        # instead of once per report. The output is split into sections by the marker at the end of the header lines:
+        # 18:05:04  cpu  %usr %nice %sys %irq %softirq  %steal %guest %wait %idle  _cpu_
+        # 18:05:04  memtotal memfree buffers cached dirty slabmem  swptotal swpfree _mem_
+        # Returns {flags: columns of a general report or a frame of a processes report (see AtopsarTopTable)}. Reports missing in
+        # the output (e.g. atopsar failed on one of them) are left out, see __get_general and parse_top_processes.
+        selected = AtopsarParser.get_report_flags() if flags is None else flags
+        markers = {v[0]: f for f, v in AtopsarParser.GENERAL_REPORTS.items() if f in selected}
+        markers.update({v[2]: v[0] for v in AtopsarParser.PROCESS_REPORTS.values() if v[0] in selected})
+        flags = ' '.join(markers.values())
+        tables = {}
+        table = None
+        flag = None
+        day = None
+        with atop_profile.stage(f'atopsar {flags} read') as s, \
+                AtopStream(AtopsarParser.__get_command(file, f'{flags} -a', begin)) as stream:
+            for i, line in enumerate(stream):
+                if i < 2:
+                    day = get_day(line) if i == 1 else None
+                    continue
+                header = line.rstrip()
+                if header.endswith('_') and header.rsplit(None, 1)[-1] in markers:
+                    # a new section, or the header repeated in the current one
+                    flag = markers[header.rsplit(None, 1)[-1]]
+                    table = tables.get(flag) or AtopsarParser.__get_table(flag, header.split(), day)
+                    tables[flag] = table
+                    continue
+                if table is None or 'logging restarted' in line:
+                    continue
+                table.add_line(line)
+            s.rows = stream.lines
+            s.values['subprocess_wait_s'] = stream.wait_time
+        if not stream.success:
+            # the last section may be incomplete or followed by the error message
+            LOGGER.debug(f'atopsar {flags} failed on {file}: {stream.last_line}')
+            tables.pop(flag, None)
+        result = {}
+        for flag, table in tables.items():
+            if table is None:
                 continue
-            log.append(output)
-        return 0 == p.poll(), log
+            with atop_profile.stage(f'atopsar {flag} columns') as s:
+                if isinstance(table, AtopsarTopTable):
+                    result[flag] = table.to_frame()
+                    s.rows = len(result[flag])
+                else:
+                    result[flag] = table.to_columns()
+                    s.rows = len(result[flag][ATOP_TIMESTAMP])
+        return result
+
+    @staticmethod
+    def __get_table(flags, headers, day):
+        if flags not in AtopsarParser.GENERAL_REPORTS:
+            return AtopsarTopTable(day)
+        _, _, cols, units = AtopsarParser.GENERAL_REPORTS[flags]
+        if not all(c in headers for c in cols):
+            return None  # unexpected columns, the report is left out
+        return AtopsarTable(headers, cols, units, day)
+
+    @staticmethod
+    def __get_general(file, flags, begin, reports):
+        # the report from parse_reports if it's there, otherwise from its own atopsar run
+        if reports is not None and flags in reports:
+            return reports[flags]
+        _, desc, cols, units = AtopsarParser.GENERAL_REPORTS[flags]
+        return AtopsarParser.__parse_general(file, flags, desc, cols, units, begin)
 
     @staticmethod
-    def __parse_general(file, flags, desc, cols):
-        import matplotlib.dates as dates
-        import re
-        success, log = AtopsarParser.__run(f'atopsar {flags} -a -r {file}')
-        if not success:
-            LOGGER.critical(f'Could not obtain {desc} related data')
-            exit(-1)
-        # third line should be headers
+    def __parse_general(file, flags, desc, cols, units, begin=None):
+        # first two lines are system info and analysis date, third line should be headers
         # david  5.4.0-56-generic  #62-Ubuntu SMP Mon Nov 23 19:20:19 UTC 2020  x86_64  2020/12/04
         # -------------------------- analysis date: 2020/12/02 --------------------------
         # 18:05:04  memtotal memfree buffers cached dirty slabmem  swptotal swpfree _mem_
-        headers = log[2].split()
-        cols_dict = {c: headers.index(c) for c in cols}
-        max_inx = max(cols_dict.values())
-        cols_dict[ATOP_TIMESTAMP] = 0
-        timestamp = headers[0]  # notice that since we don't specify date (just time), datatime.now().date() is assumed
-        data = []
-        TIME_RE = re.compile(r"^\d{2}:\d{2}:\d{2}$")
-        for line in log[3:]:
-            if 'logging restarted' in line:
-                continue
-            tokens = line.split()
-            if TIME_RE.match(tokens[0]):
-                timestamp = dates.datestr2num(tokens[0])
-                tokens[0] = timestamp
-            else:
-                tokens.insert(0, timestamp)
-            if len(tokens) >= max_inx:  # in case of missing records
-                data.append({k: tokens[v] for k, v in cols_dict.items()})
-        return data
+        table = None
+        day = None
+        with atop_profile.stage(f'atopsar {flags} read') as s, \
+                AtopStream(AtopsarParser.__get_command(file, f'{flags} -a', begin)) as stream:
+            for i, line in enumerate(stream):
+                if i < 2:
+                    day = get_day(line) if i == 1 else None
+                    continue
+                if table is None:
+                    headers = line.split()
+                    if not all(c in headers for c in cols):
+                        break  # not a report, most likely an error message
+                    table = AtopsarTable(headers, cols, units, day)
+                    continue
+                if 'logging restarted' in line:
+                    continue
+                table.add_line(line)
+            s.rows = stream.lines
+            s.values['subprocess_wait_s'] = stream.wait_time
+        if not stream.success or table is None:
+            raise AtopsarError(f'Could not obtain {desc} related data')
+        with atop_profile.stage(f'atopsar {flags} columns') as s:
+            columns = table.to_columns()
+            s.rows = len(columns[ATOP_TIMESTAMP])
+        return columns
 
     @staticmethod
-    def __parse_processes(file, flags, desc):
-        import matplotlib.dates as dates
-        success, log = AtopsarParser.__run(f'atopsar {flags} -r {file}')
-        if not success:
-            if 'no per-process disk counters available' in log[-1]:
-                return {}
-            LOGGER.critical(f'Could not obtain {desc} related data')
-            exit(-1)
-        # third line should be headers
+    def __parse_processes(file, flags, desc, begin=None):
+        # first two lines are system info and analysis date, third line should be headers
         # david  5.4.0-56-generic  #62-Ubuntu SMP Mon Nov 23 19:20:19 UTC 2020  x86_64  2020/12/10
         # -------------------------- analysis date: 2020/12/02 --------------------------
         # 17:29:24    pid command  mem% |   pid command  mem% |   pid command  mem%_top3_
-        data = {}
-        for line in log[3:]:
-            # first 8 characters are time, the rest is the line
-            time = line[:8]
-            text = line[8:]
-            data[time] = text
-        return data
+        table = AtopsarTopTable(None)
+        with atop_profile.stage(f'atopsar {flags} read') as s, \
+                AtopStream(AtopsarParser.__get_command(file, flags, begin)) as stream:
+            for i, line in enumerate(stream):
+                if i < 3:
+                    table.day = get_day(line) if i == 1 else table.day
+                    continue
+                table.add_line(line)
+            s.rows = stream.lines
+            s.values['subprocess_wait_s'] = stream.wait_time
+        if not stream.success:
+            if 'no per-process disk counters available' in stream.last_line:
+                return None
+            raise AtopsarError(f'Could not obtain {desc} related data')
+        return table.to_frame()
 
     @staticmethod
-    def parse_cpu(file):
-        cols = ['cpu', '%usr', '%sys', '%idle']
-        data = AtopsarParser.__parse_general(file, '-c', 'cpu', cols)
-        df = pd.DataFrame(data)
-        tmp = df[df['cpu'] != 'all']['cpu']
-        no_of_cores = (pd.to_numeric(tmp).max() + 1)
-        LOGGER.info(f'Detected {no_of_cores} cores (including virtual cores)')
-        df = df[df['cpu'] == 'all']
-        df.rename(columns={'%usr': 'usr', '%sys': 'sys', '%idle': 'idle'}, inplace=True)
-        df[['usr', 'sys', 'idle']] = df[['usr', 'sys', 'idle']].apply(pd.to_numeric)
-        data_util = df[[ATOP_TIMESTAMP, 'usr', 'sys']].copy()
-        data_util[['usr', 'sys']] = data_util[['usr', 'sys']] / no_of_cores
-        result = AtopResource('cpu', '%', data_util, desc=f'100% means all (physical and virtual) cores are used.\n{no_of_cores} detected.')
-        result.data_opt = df[[ATOP_TIMESTAMP]].copy()
-        result.data_opt['busy cores'] = no_of_cores - df['idle'] / 100.0
-        result.data_opt_unit = 'cores'
-        return result
+    def parse_cpu(file, begin=None, reports=None):
+        data = AtopsarParser.__get_general(file, '-c', begin, reports)
+        with atop_profile.stage('cpu dataframe', len(data['cpu'])):
+            total = data['cpu'] == 'all'
+            cores = data['cpu'][~total].astype(np.int64)
+            no_of_cores = cores.max() + 1 if len(cores) else 1
+            LOGGER.info(f'Detected {no_of_cores} cores (including virtual cores)')
+            timestamps = data[ATOP_TIMESTAMP][total]
+            data_util = pd.DataFrame({ATOP_TIMESTAMP: timestamps,
+                                      'usr': data['%usr'][total] / no_of_cores,
+                                      'sys': data['%sys'][total] / no_of_cores})
+            result = AtopResource('cpu', '%', data_util, desc=f'100% means all (physical and virtual) cores are used.\n{no_of_cores} detected.')
+            result.data_opt = pd.DataFrame({ATOP_TIMESTAMP: timestamps,
+                                            'busy cores': no_of_cores - data['%idle'][total] / 100.0})
+            result.data_opt_unit = 'cores'
+            return result
 
     @staticmethod
-    def parse_drives(file):
+    def parse_drives(file, begin=None, reports=None):
         # 18:05:04 disk busy read/s KB/read writ/s KB/writ avque avserv _dsk_
-        cols = ['disk', 'busy', 'read/s', 'KB/read', 'writ/s', 'KB/writ']
-        data = AtopsarParser.__parse_general(file, '-d', 'hdd', cols)
-        df = pd.DataFrame(data)
-        df['busy'] = df['busy'].str.replace('%', '')
-        df[cols[1:]] = df[cols[1:]].apply(pd.to_numeric)
-        df[cols[1:]] = df[cols[1:]].apply(pd.to_numeric)
-        result = []
-        for d, data in df.groupby('disk'):
-            drive = AtopResource(f'disk: {d}', '%', data[[ATOP_TIMESTAMP, 'busy']])
-            data['read'] = data['read/s'] * data['KB/read'] / 1024
-            data['write'] = data['writ/s'] * data['KB/writ'] / 1024
-            drive.data_opt = data[[ATOP_TIMESTAMP, 'read', 'write']]
-            drive.data_opt_unit = 'MB/s'
-            result.append(drive)
-        return result
+        df = pd.DataFrame(AtopsarParser.__get_general(file, '-d', begin, reports))
+        with atop_profile.stage('drives dataframe', len(df)):
+            df['read'] = df['read/s'] * df['KB/read'] / 1024
+            df['write'] = df['writ/s'] * df['KB/writ'] / 1024
+            result = []
+            for d, data in df.groupby('disk'):
+                drive = AtopResource(f'disk: {d}', '%', data[[ATOP_TIMESTAMP, 'busy']])
+                drive.data_opt = data[[ATOP_TIMESTAMP, 'read', 'write']]
+                drive.data_opt_unit = 'MB/s'
+                result.append(drive)
+            return result
 
     @staticmethod
-    def parse_memory(file):
+    def parse_memory(file, begin=None, reports=None):
         # 18:05:04  memtotal memfree buffers cached dirty slabmem  swptotal swpfree _mem_
         # 18:05:05    31986M  27272M    111M  1196M    0M    290M    32767M  32767M
-        cols = ['memtotal', 'memfree', 'cached', 'buffers', 'swptotal', 'swpfree']
-        data = AtopsarParser.__parse_general(file, '-m', 'memory', cols)
-        df = pd.DataFrame(data)
-        for c in cols:
-            df[c] = df[c].str.replace('M', '')
-        df[cols] = df[cols].apply(pd.to_numeric)
-        # get memory usage
-        mem_total = df['memtotal'][0]
-        LOGGER.info(f'Detected {mem_total} MB of memory')
-        df['allocated'] = (df['memtotal'] - df['cached'] - df['memfree'] - df['buffers']) / mem_total * 100
-        df['cache'] = (df['cached'] + df['buffers']) / mem_total * 100
-        df['occupancy'] = (df['memtotal'] - df['memfree']) / mem_total * 100
-        # get swap usage
-        swap_total = df['swptotal'][0]
-        LOGGER.info(f'Detected {swap_total} MB of swap')
-        df['swap'] = (df['swptotal'] - df['swpfree']) / swap_total * 100
-        # prepare result
-        df = df[[ATOP_TIMESTAMP, 'allocated', 'cache', 'occupancy', 'swap']]
-        return AtopResource('ram', '%', df, desc=f'Detected {mem_total} MB of memory and {swap_total} MB of Swap.')
+        data = AtopsarParser.__get_general(file, '-m', begin, reports)
+        if not len(data['memtotal']):
+            raise AtopsarError('No memory related data')
+        with atop_profile.stage('memory dataframe', len(data['memtotal'])):
+            # get memory usage
+            mem_total = data['memtotal'][0]
+            LOGGER.info(f'Detected {mem_total} MB of memory')
+            df = pd.DataFrame({ATOP_TIMESTAMP: data[ATOP_TIMESTAMP]})
+            df['allocated'] = (data['memtotal'] - data['cached'] - data['memfree'] - data['buffers']) / mem_total * 100
+            df['cache'] = (data['cached'] + data['buffers']) / mem_total * 100
+            df['occupancy'] = (data['memtotal'] - data['memfree']) / mem_total * 100
+            # get swap usage
+            swap_total = data['swptotal'][0]
+            LOGGER.info(f'Detected {swap_total} MB of swap')
+            df['swap'] = (data['swptotal'] - data['swpfree']) / swap_total * 100
+            return AtopResource('ram', '%', df, desc=f'Detected {mem_total} MB of memory and {swap_total} MB of Swap.')
 
     @staticmethod
-    def parse_gpus(file):
+    def parse_gpus(file, begin=None, reports=None):
         # 18:05:04     busaddr   gpubusy  membusy  memocc  memtot memuse  gputype   _gpu_
         # 18:05:05   0/0000:01:0      1%       0%     22%   6078M  1378M  rce_GTX_1060
-        num_cols = ['gpubusy', 'membusy', 'memocc']
-        info_cols = ['busaddr', 'gputype']
-        data = AtopsarParser.__parse_general(file, '-g', 'gpu', num_cols + info_cols)
-        df = pd.DataFrame(data)
-        for c in num_cols:
-            df[c] = pd.to_numeric(df[c].str.replace('%', ''))
-        df.rename(columns={'gpubusy': 'utilization', 'membusy': 'read/write', 'memocc': 'memused'}, inplace=True)
-        result = []
-        for g, data in df.groupby('busaddr'):
-            gpu_type = data['gputype'].iloc[0]
-            name = f'{g} {gpu_type}'
-            gpu = AtopResource(f'gpu: {name}', '%', data[[ATOP_TIMESTAMP, 'utilization', 'read/write', 'memused']])
-            result.append(gpu)
-        return result
+        data = AtopsarParser.__get_general(file, '-g', begin, reports)
+        with atop_profile.stage('gpus dataframe', len(data['gpubusy'])):
+            df = pd.DataFrame(data)
+            df.rename(columns={'gpubusy': 'utilization', 'membusy': 'read/write', 'memocc': 'memused'}, inplace=True)
+            result = []
+            for g, data in df.groupby('busaddr'):
+                gpu_type = data['gputype'].iloc[0]
+                name = f'{g} {gpu_type}'
+                gpu = AtopResource(f'gpu: {name}', '%', data[[ATOP_TIMESTAMP, 'utilization', 'read/write', 'memused']])
+                result.append(gpu)
+            return result
+
+    @staticmethod
+    def parse_top_processes(file, resource, begin=None, reports=None):
+        # the report from parse_reports if it's there, otherwise from its own atopsar run
+        flags, desc, _ = AtopsarParser.PROCESS_REPORTS[resource]
+        if reports is not None and flags in reports:
+            return reports[flags]
+        return AtopsarParser.__parse_processes(file, flags, desc, begin)
 
     @staticmethod
     def parse_processes(file):
-        disk_data = AtopsarParser.__parse_processes(file, '-D', 'disk processes')
-        cpu_data = AtopsarParser.__parse_processes(file, '-O', 'cpu processes')
-        memory_data = AtopsarParser.__parse_processes(file, '-G', 'memory processes')
-        # assume times are the same everywhere
-        all_keys = set(disk_data) | set(cpu_data) | set(memory_data)
-        result = []
-        NA = ''
-        for k in all_keys:
-            result.append(AtopProcess(k, disk_data.get(k, NA), cpu_data.get(k, NA), memory_data.get(k, NA)))
-        return result
+        disk_data = AtopsarParser.parse_top_processes(file, 'disk')
+        cpu_data = AtopsarParser.parse_top_processes(file, 'cpu')
+        memory_data = AtopsarParser.parse_top_processes(file, 'memory')
+        return AtopsarParser.merge_processes(disk_data, cpu_data, memory_data)
+
+    @staticmethod
+    def merge_processes(disk_data, cpu_data, memory_data):
+        # frames of parse_top_processes (None if not available) to a single table
+        return AtopProcesses.from_top({'dsk': disk_data, 'cpu': cpu_data, 'ram': memory_data})
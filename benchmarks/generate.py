@@ -0,0 +1,222 @@
+import os
+import struct
+import sys
+import time
+import zlib
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atop_raw
+
+# Synthetic atop logs for the benchmarks, see run.py.
+# A log is a directory with the output of each atopsar flag (atopsar_<flag>.txt) and of atop -P (atop_P.txt),
+# the fake atop and atopsar in bin replay them when the directory is passed as the atop file.
+# The processes are also written as a raw atop file (atop.raw) for the native reader, see atop_raw.
+HOST = 'bench'
+EPOCH = 1606905600  # 2020/12/02 10:40:00 UTC
+CHUNK_LINES = 1 << 16
+NAMES = ['relion_refine', 'python 3', 'ctffind', 'java', 'atop']
+TSTAT = atop_raw.get_dtype(atop_raw.TSTAT_2_7)
+
+
+def get_banner(epoch):
+    day = time.strftime('%Y/%m/%d', time.localtime(epoch))
+    return [f'{HOST}  5.4.0-56-generic  #62-Ubuntu SMP Mon Nov 23 19:20:19 UTC 2020  x86_64  {day}',
+            f'-------------------------- analysis date: {day} --------------------------']
+
+
+def get_times(samples, interval):
+    # epoch and local HH:MM:SS of the samples, the first one is the time of the header line
+    epochs = EPOCH + np.arange(samples + 1) * interval
+    return epochs, [time.strftime('%H:%M:%S', time.localtime(e)) for e in epochs.tolist()]
+
+
+def write_lines(path, lines):
+    with open(path, 'w') as f:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= CHUNK_LINES:
+                f.write('\n'.join(chunk) + '\n')
+                chunk = []
+        if chunk:
+            f.write('\n'.join(chunk) + '\n')
+
+
+def generate_cpu(times, rng, cores):
+    yield f'{times[0]}  cpu  %usr %nice %sys %irq %softirq  %steal %guest %wait %idle  _cpu_'
+    for t in times[1:]:
+        usr = rng.integers(0, 100, cores).tolist()
+        sys_ = rng.integers(0, 100 - max(usr) + 1, cores).tolist()
+        yield f'{t}  all  {sum(usr)}  0  {sum(sys_)}  0  0  0  0  0  {cores * 100 - sum(usr) - sum(sys_)}'
+        for c in range(cores):
+            yield f'           {c}  {usr[c]}  0  {sys_[c]}  0  0  0  0  0  {100 - usr[c] - sys_[c]}'
+
+
+def generate_memory(times, rng):
+    yield f'{times[0]}  memtotal memfree buffers cached dirty slabmem  swptotal swpfree _mem_'
+    for t, free, cached, swap in zip(times[1:], rng.integers(1000, 30000, len(times)).tolist(),
+                                     rng.integers(100, 2000, len(times)).tolist(),
+                                     rng.integers(30000, 32767, len(times)).tolist()):
+        yield f'{t}    31986M  {free}M    111M  {cached}M    0M    290M    32767M  {swap}M'
+
+
+def generate_drives(times, rng, drives):
+    names = ['sda', 'sdb', 'nvme0n1', 'nvme1n1'][:drives] + [f'sd{i}' for i in range(4, drives)]
+    yield f'{times[0]}  disk           busy read/s KB/read  writ/s KB/writ avque avserv _dsk_'
+    for t in times[1:]:
+        busy = rng.integers(0, 100, drives).tolist()
+        rates = np.round(rng.random((drives, 4)) * [10, 50, 10, 50], 1).tolist()
+        for i, d in enumerate(names):
+            prefix = t if i == 0 else ' ' * len(t)
+            r = rates[i]
+            yield f'{prefix}  {d}   {busy[i]}%  {r[0]}  {r[1]}  {r[2]}  {r[3]}  1.00  0.50 ms'
+
+
+def generate_gpus(times, rng, gpus):
+    yield f'{times[0]}     busaddr   gpubusy  membusy  memocc  memtot memuse  gputype   _gpu_'
+    for t in times[1:]:
+        values = rng.integers(0, 100, (gpus, 3)).tolist()
+        for i, v in enumerate(values):
+            prefix = t if i == 0 else ' ' * len(t)
+            yield f'{prefix}   {i}/0000:0{i + 1}:0      {v[0]}%       {v[1]}%     {v[2]}%   6078M  1378M  rce_GTX_1060'
+
+
+def generate_top(times, rng, unit):
+    yield f'{times[0]}    pid command  {unit} |   pid command  {unit} |   pid command  {unit}_top3_'
+    for t in times[1:]:
+        pids = rng.integers(1, 99999, 3).tolist()
+        util = sorted(rng.integers(0, 99, 3).tolist(), reverse=True)
+        yield f'{t}   {pids[0]:5d} python   {util[0]:2d}% | {pids[1]:5d} relion   {util[1]:2d}% | ' \
+              f'{pids[2]:5d} atop     {util[2]:2d}%'
+
+
+def write_atopsar(directory, samples, interval, cores, drives, gpus, rng):
+    epochs, times = get_times(samples, interval)
+    banner = get_banner(epochs[0])
+    reports = {'c': generate_cpu(times, rng, cores),
+               'm': generate_memory(times, rng),
+               'd': generate_drives(times, rng, drives),
+               'O': generate_top(times, rng, 'cpu%'),
+               'G': generate_top(times, rng, 'mem%'),
+               'D': generate_top(times, rng, 'dsk%')}
+    if gpus:
+        reports['g'] = generate_gpus(times, rng, gpus)
+    for flag, lines in reports.items():
+        write_lines(os.path.join(directory, f'atopsar_{flag}.txt'), banner + list(lines))
+
+
+def generate_samples(samples, interval, processes, rng):
+    # a few processes end in each sample and new ones start, pids are reused
+    epochs, _ = get_times(samples, interval)
+    running = {pid: (NAMES[pid % len(NAMES)], EPOCH - int(rng.integers(0, 3600))) for pid in range(100, 100 + processes)}
+    next_pid = 100 + processes
+    for epoch in epochs.tolist():
+        pids = sorted(running)
+        ending = set(rng.choice(pids, max(1, processes // 100), replace=False).tolist())
+        n = len(pids)
+        yield {'epoch': epoch, 'pids': pids, 'names': [running[pid][0] for pid in pids],
+               'starts': [running[pid][1] for pid in pids], 'states': ['E' if pid in ending else 'S' for pid in pids],
+               'prc': rng.integers(0, 100, (n, 4)), 'prm': rng.integers(0, 9000, (n, 8)),
+               'growth': rng.integers(-50, 50, (n, 2)), 'prd': rng.integers(0, 99, (n, 3)),
+               'pre': rng.integers(0, 999, (n, 4))}
+        for pid in ending:
+            del running[pid]
+            pid = next_pid if rng.random() < 0.5 else pid  # reuse the pid
+            next_pid += 1
+            running[pid] = (NAMES[pid % len(NAMES)], epoch + interval)
+
+
+def get_process_lines(sample, interval):
+    # atop -P output of a sample
+    epoch = sample['epoch']
+    common = f'{HOST} {epoch} {time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(epoch))} {interval}'
+    rows = list(zip(sample['pids'], sample['names'], sample['starts'], sample['states']))
+    for pid, name, start, state in rows:
+        yield f'PRG {common} {pid} ({name}) {state} 0 0 {pid} 1 0 {start} (/usr/bin/{name} --arg (x)) ' \
+              f'1 0 1 0 0 0 0 0 0 0 0 y 0 0 -'
+    for (pid, name, _, state), v in zip(rows, sample['prc'].tolist()):
+        yield f'PRC {common} {pid} ({name}) {state} 100 {v[0]} {v[1] // 5} 0 120 0 0 1 {v[3]} {pid} y'
+    for (pid, name, _, state), v, g in zip(rows, sample['prm'].tolist(), sample['growth'].tolist()):
+        yield f'PRM {common} {pid} ({name}) {state} 4096 {v[0] + 1000} {v[1] // 10} 10 {g[0]} ' \
+              f'{g[1]} {v[2] // 1000} {v[3] // 3000} 10 {v[4] // 20} 8 {v[5] // 1000} {pid} y 0'
+    for (pid, name, _, state), v in zip(rows, sample['prd'].tolist()):
+        yield f'PRD {common} {pid} ({name}) {state} n y 1 {v[0]} 1 {v[1]} {v[2] // 10} {pid} y'
+    for (pid, name, _, state), v in zip(rows, sample['pre'].tolist()):
+        yield f'PRE {common} {pid} ({name}) {state} A 1 1 {v[0] // 10} {v[1] // 10} {v[2]} {v[3]} 1'
+    yield 'SEP'
+
+
+def get_raw_header():
+    # atop 2.7 with 100 clock ticks, no system level data
+    utsname = b''.join(v.encode().ljust(65, b'\0') for v in ['Linux', HOST, '5.4.0-56-generic', '', 'x86_64', ''])
+    return struct.pack(atop_raw.HEADER.format('<'), atop_raw.MAGIC, 0x8207, 0, 0,
+                       struct.calcsize(atop_raw.HEADER.format('<')), struct.calcsize(atop_raw.RECORD.format('<')),
+                       100, 0, TSTAT.itemsize, utsname, b'', 4096, 0, 5, 4, 0)
+
+
+def get_raw_sample(sample, interval):
+    # the same values as get_process_lines, as struct tstat
+    n = len(sample['pids'])
+    tasks = np.zeros(n, dtype=TSTAT)
+    gen, cpu, mem, dsk, gpu = (tasks[s] for s in ('gen', 'cpu', 'mem', 'dsk', 'gpu'))
+    gen['pid'] = gen['tgid'] = sample['pids']
+    gen['name'] = sample['names']
+    gen['cmdline'] = [f'/usr/bin/{name} --arg x' for name in sample['names']]
+    gen['btime'] = sample['starts']
+    gen['state'] = sample['states']
+    gen['isproc'] = gen['nthr'] = 1
+    prc, prm, growth, prd, pre = (sample[k] for k in ('prc', 'prm', 'growth', 'prd', 'pre'))
+    cpu['utime'], cpu['stime'], cpu['prio'], cpu['curcpu'], cpu['sleepavg'] = prc[:, 0], prc[:, 1] // 5, 120, 1, prc[:, 3]
+    mem['vmem'], mem['rmem'], mem['vexec'] = prm[:, 0] + 1000, prm[:, 1] // 10, 10
+    mem['vgrow'], mem['rgrow'] = growth[:, 0], growth[:, 1]
+    mem['minflt'], mem['majflt'] = prm[:, 2] // 1000, prm[:, 3] // 3000
+    mem['vdata'], mem['vstack'], mem['vswap'] = prm[:, 4] // 20, 8, prm[:, 5] // 1000
+    dsk['rio'], dsk['rsz'], dsk['wio'], dsk['wsz'], dsk['cwsz'] = 1, prd[:, 0], 1, prd[:, 1], prd[:, 2] // 10
+    gpu['state'], gpu['nrgpus'], gpu['gpulist'], gpu['sample'] = b'A', 1, 1, 1
+    gpu['gpubusy'], gpu['membusy'], gpu['memnow'], gpu['memcum'] = pre[:, 0] // 10, pre[:, 1] // 10, pre[:, 2], pre[:, 3]
+    sstat = zlib.compress(b'')
+    tstat = zlib.compress(tasks.tobytes())
+    return struct.pack(atop_raw.RECORD.format('<'), sample['epoch'], 0, len(sstat), len(tstat), interval, n, n, n, n,
+                       0, 0, 0, 0, sample['states'].count('E'), 0) + sstat + tstat
+
+
+def write_atop(directory, samples, interval, processes, rng):
+    # atop -P output (atop_P.txt) and the raw file (atop.raw) of the same samples
+    with open(os.path.join(directory, 'atop.raw'), 'wb') as raw:
+        raw.write(get_raw_header())
+
+        def get_lines():
+            yield 'RESET'
+            for sample in generate_samples(samples, interval, processes, rng):
+                raw.write(get_raw_sample(sample, interval))
+                yield from get_process_lines(sample, interval)
+        write_lines(os.path.join(directory, 'atop_P.txt'), get_lines())
+
+
+def generate(directory, samples, interval=10, processes=100, cores=8, drives=2, gpus=1, seed=0):
+    # records: samples * (cores + drives + gpus + 5) for atopsar, samples * processes * 5 for atop -P
+    os.makedirs(directory, exist_ok=True)
+    write_atopsar(directory, samples, interval, cores, drives, gpus, np.random.default_rng(seed))
+    write_atop(directory, samples, interval, processes, np.random.default_rng(seed + 1))
+    return directory
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='generate a synthetic atop log for the benchmarks')
+    parser.add_argument('-dest', help='directory of the generated log', required=True)
+    parser.add_argument('-samples', help='number of samples', type=int, default=8640)
+    parser.add_argument('-interval', help='seconds between samples', type=int, default=10)
+    parser.add_argument('-processes', help='number of processes running in each sample', type=int, default=100)
+    parser.add_argument('-cores', help='number of cpu cores', type=int, default=8)
+    parser.add_argument('-drives', help='number of drives', type=int, default=2)
+    parser.add_argument('-gpus', help='number of gpus, 0 for none', type=int, default=1)
+    parser.add_argument('-seed', help='seed of the random values', type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    start = time.perf_counter()
+    generate(args.dest, args.samples, args.interval, args.processes, args.cores, args.drives, args.gpus, args.seed)
+    print(f'{args.dest} generated in {time.perf_counter() - start:.1f} s', file=sys.stderr)
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Import time budget of the headless (parsing and serialization) path.
+# Each check runs in a fresh interpreter: it fails if matplotlib gets imported or if importing main takes
+# longer than the budget. Exits with 1 on failure, so it can run next to run.py to catch regressions offline.
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+HEADLESS_MODULES = ['main', 'atop_report', 'atopsar_parser', 'process_info', 'report_format', 'atop_cache',
+                    'atop_batch', 'scipion_timeline', 'process_store']
+
+CHECK = '''
+import json, sys, time
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'matplotlib': sorted(m for m in sys.modules if m.split('.')[0] == 'matplotlib')[:3]}}))
+'''
+
+
+def check(code, env=None):
+    out = subprocess.run([sys.executable, '-c', CHECK.format(code=code)], cwd=ROOT, env=env, check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def check_headless_run(data, tmp):
+    # parse a synthetic log and save it as a report and a pickle, without plotting
+    env = dict(os.environ, PATH=os.path.join(BENCHMARKS, 'bin') + os.pathsep + os.environ['PATH'])
+    argv = ['main.py', '-atop', data, '-no_cache', '-to_report', os.path.join(tmp, 'report'),
+            '-to_pickle', os.path.join(tmp, 'report.pickle')]
+    code = f'import logging; logging.disable(logging.INFO)\nsys.argv = {argv!r}\nimport main\nmain.main(main.parse_args())'
+    return check(code, env)
+
+
+def main(args):
+    failures = []
+    for module in HEADLESS_MODULES:
+        r = check(f'import {module}')
+        print(f'import {module:<18}{r["seconds"]:>8.3f} s')
+        if r['matplotlib']:
+            failures.append(f'import {module} imports {", ".join(r["matplotlib"])}')
+        if module == 'main' and r['seconds'] > args.budget:
+            failures.append(f'import main takes {r["seconds"]:.3f} s, budget is {args.budget:.3f} s')
+    with tempfile.TemporaryDirectory() as tmp:
+        from generate import generate
+        data = generate(os.path.join(tmp, 'atop_log'), 100, processes=10)
+        r = check_headless_run(data, tmp)
+        print(f'{"headless run":<25}{r["seconds"]:>8.3f} s')
+        if r['matplotlib']:
+            failures.append(f'headless run imports {", ".join(r["matplotlib"])}')
+    for f in failures:
+        print(f'Failure: {f}')
+    if failures:
+        sys.exit(1)
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='check the import time of the headless path')
+    parser.add_argument('-budget', help='maximal import time of main in seconds', type=float, default=1.0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
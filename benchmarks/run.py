@@ -0,0 +1,153 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Times the stages of AtopVis on a synthetic log (see generate.py), with the fake atop and atopsar of bin on PATH.
+# Each stage runs in a fresh process, so that its peak memory is not hidden by the previous stages.
+# Reported peak memory is the maximum resident set size of that process, including the untimed setup
+# (e.g. parsing the processes before computing the statistics).
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+STAGES = ['atopsar', 'processes', 'native', 'statistics', 'plot']
+
+
+def bench_atopsar(data, workers):
+    from atop_report import AtopReport
+    start = time.perf_counter()
+    report = AtopReport(data, workers)
+    seconds = time.perf_counter() - start
+    records = sum(len(r.data) for r in report.resources) + len(report.processes)
+    return seconds, records
+
+
+def bench_processes(data, workers):
+    import process_info
+    start = time.perf_counter()
+    processes, records = process_info.parse(data)
+    return time.perf_counter() - start, len(records)
+
+
+def bench_native(data, workers):
+    # processes decoded from the raw file, without atop
+    import process_info
+    start = time.perf_counter()
+    processes, records = process_info.parse(os.path.join(data, 'atop.raw'), native=True)
+    return time.perf_counter() - start, len(records)
+
+
+def bench_statistics(data, workers):
+    import process_info
+    processes, records = process_info.parse(data)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        process_info.get_statistics(processes, records, os.path.join(tmp, 'statistics.xlsx'), workers)
+        return time.perf_counter() - start, len(records)
+
+
+def bench_plot(data, workers):
+    import matplotlib
+    matplotlib.use('Agg')
+    from atop_report import AtopReport
+    from matplotlib_plotter import MatplotlibPlotter
+    report = AtopReport(data, workers)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        MatplotlibPlotter(report).plot(False, os.path.join(tmp, 'plot.png'))
+        seconds = time.perf_counter() - start
+    return seconds, sum(len(r.data) for r in report.resources)
+
+
+def run_stage(stage, data, workers):
+    # in the stage process
+    import logging
+    import resource
+    logging.disable(logging.INFO)
+    seconds, records = globals()[f'bench_{stage}'](data, workers)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kB on Linux
+    print(json.dumps({'seconds': seconds, 'records': records, 'peak_mb': peak}))
+
+
+def measure(stage, data, workers, repeat):
+    # best time and highest peak memory of repeat runs
+    env = dict(os.environ, PATH=os.path.join(BENCHMARKS, 'bin') + os.pathsep + os.environ['PATH'])
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, __file__, '-stage', stage, '-data', data, '-workers', str(workers)],
+                             env=env, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    seconds = min(r['seconds'] for r in results)
+    records = results[0]['records']
+    return {'seconds': seconds, 'records': records, 'records_per_s': records / seconds if seconds else 0,
+            'peak_mb': max(r['peak_mb'] for r in results)}
+
+
+def compare(results, baseline, tolerance):
+    # regressions: slower or bigger by more than tolerance (relative)
+    regressions = []
+    for stage, r in results.items():
+        b = baseline.get(stage)
+        if b is None:
+            continue
+        for key in ('seconds', 'peak_mb'):
+            if r[key] > b[key] * (1 + tolerance):
+                regressions.append(f'{stage}: {key} {b[key]:.2f} -> {r[key]:.2f}')
+    return regressions
+
+
+def main(args):
+    if args.stage:
+        run_stage(args.stage, args.data, args.workers)
+        return
+    tmp = None
+    data = args.data
+    if data is None:
+        from generate import generate
+        tmp = tempfile.TemporaryDirectory()
+        data = os.path.join(tmp.name, 'atop_log')
+        start = time.perf_counter()
+        generate(data, args.samples, processes=args.processes)
+        print(f'Generated {args.samples} samples with {args.processes} processes '
+              f'in {time.perf_counter() - start:.1f} s')
+    results = {}
+    print(f'{"stage":<12}{"seconds":>10}{"records":>12}{"records/s":>14}{"peak MB":>10}')
+    for stage in args.stages:
+        r = results[stage] = measure(stage, data, args.workers, args.repeat)
+        print(f'{stage:<12}{r["seconds"]:>10.3f}{r["records"]:>12}{r["records_per_s"]:>14.0f}{r["peak_mb"]:>10.1f}')
+    if tmp:
+        tmp.cleanup()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f'Regression {r}')
+        if regressions:
+            sys.exit(1)
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='benchmark AtopVis on a synthetic atop log')
+    parser.add_argument('-data', help='directory generated by generate.py, a new one is generated if not set')
+    parser.add_argument('-samples', help='number of samples of the generated log', type=int, default=8640)
+    parser.add_argument('-processes', help='number of processes in each sample of the generated log', type=int,
+                        default=100)
+    parser.add_argument('-stages', help='stages to run', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('-workers', help='workers of the stages', type=int, default=1)
+    parser.add_argument('-repeat', help='number of runs of each stage, the best time is reported', type=int,
+                        default=1)
+    parser.add_argument('-json', help='write the results to a json file, e.g. a baseline for -compare')
+    parser.add_argument('-compare', help='json file with baseline results, exits with 1 on regression')
+    parser.add_argument('-tolerance', help='relative slowdown (or memory growth) tolerated by -compare', type=float,
+                        default=0.2)
+    parser.add_argument('-stage', help=argparse.SUPPRESS, choices=STAGES)  # internal, runs a single stage
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def min_max_indices(x, y, x_min, x_max, bins):
+    # Indices of the samples to draw for the visible range: first, last, minimum and maximum of each bin.
+    # Extremes are always kept, so short spikes remain visible however many samples fall on a single pixel.
+    start = max(np.searchsorted(x, x_min, 'left') - 1, 0)  # one point outside the view on each side
+    end = min(np.searchsorted(x, x_max, 'right') + 1, len(x))
+    n = end - start
+    if n <= 4 * bins:
+        return np.arange(start, end)
+    size = -(-n // bins)  # samples per bin
+    rows = -(-n // size)
+    values = np.full(rows * size, np.nan)
+    values[:n] = y[start:end]
+    values = values.reshape(rows, size)
+    missing = np.isnan(values)
+    offsets = np.arange(rows) * size + start
+    lows = np.where(missing, np.inf, values).argmin(axis=1) + offsets
+    highs = np.where(missing, -np.inf, values).argmax(axis=1) + offsets
+    return np.unique(np.concatenate([offsets, lows, highs, [end - 1]]).clip(start, end - 1))
+
+
+class LineDecimator:
+    # Keeps the full resolution data of the registered lines and lets them draw only a min/max decimated
+    # version of the visible range, sized to the width of the axis in pixels.
+    # It is refreshed from the full data whenever the view changes, so the drawing cost does not grow with the data.
+    def __init__(self):
+        self.lines = {}  # line: (x, y)
+        self.axes = {}  # axis: [lines]
+        self.scale = 1  # bins per pixel, e.g. when saving with a higher dpi
+
+    def add(self, line):
+        x, y = line.get_data()
+        self.set_data(line, x, y)
+        ax = line.axes
+        if ax not in self.axes:
+            # every axis sharing the x axis notifies its own change, so each one refreshes only its own lines
+            ax.callbacks.connect('xlim_changed', self.__refresh_axis)
+            self.axes[ax] = []
+        self.axes[ax].append(line)
+
+    def set_data(self, line, x, y):
+        self.lines[line] = (np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+        self.__decimate(line)
+
+    def refresh(self, scale=None):
+        if scale is not None:
+            self.scale = scale
+        for line in self.lines:
+            self.__decimate(line)
+
+    def __refresh_axis(self, ax):
+        for line in self.axes[ax]:
+            self.__decimate(line)
+
+    def __decimate(self, line):
+        x, y = self.lines[line]
+        ax = line.axes
+        x_min, x_max = ax.get_xlim()
+        bins = max(int(ax.bbox.width * self.scale), 1)
+        indices = min_max_indices(x, y, x_min, x_max, bins)
+        line.set_data(x[indices], y[indices])
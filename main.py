@@ -1,48 +1,121 @@
 import pickle
+import atop_batch
+import atop_profile
+import report_format
+from atop_cache import open_cache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
 from atop_report import AtopReport
-from scipion_timeline import ScipionTimeline
-from matplotlib_plotter import MatplotlibPlotter
+
+# Plotting modules (matplotlib) are imported only when a plot is requested,
+# parsing and converting reports must stay cheap to start, e.g. in cron jobs.
 
 
 def load_report(args):
     report = None
     atop_file = args.atop
     if atop_file:
-        report = AtopReport(atop_file)
+        # a followed file keeps changing, caching it is pointless
+        cache = None if args.no_cache or args.follow else open_cache(args.cache_dir, args.cache_size << 20)
+        if cache:
+            with atop_profile.stage('cache load'):
+                report = cache.load(atop_file)
+        if report is None:
+            report = AtopReport(atop_file, args.workers)
+            if cache:
+                with atop_profile.stage('cache store'):
+                    cache.store(atop_file, report)
+    elif args.batch:
+        cache = None if args.no_cache else open_cache(args.cache_dir, args.cache_size << 20)
+        report = atop_batch.load_report(args.batch, args.workers, args.memory_limit << 20, cache)
+    elif args.report:
+        with atop_profile.stage('report load'):
+            report = report_format.load(args.report)
     elif args.pickle:
-        with open(args.pickle, 'rb') as f:
+        with atop_profile.stage('pickle load'), open(args.pickle, 'rb') as f:
             report = pickle.load(f)
     if args.timeline:
+        from scipion_timeline import ScipionTimeline
         report.timeline = ScipionTimeline(args.timeline)
     return report
 
 
 def main(args):
     report = load_report(args)
+    if args.process_store:
+        from process_store import ProcessStore
+        with atop_profile.stage('process store'):
+            store = ProcessStore(args.process_store)
+            report.resources.append(store.to_resource(args.process_names, args.process_field, args.process_agg))
+
+    if args.to_report:
+        with atop_profile.stage('report save'):
+            report_format.save(report, args.to_report)
 
     if args.to_pickle:
-        with open(args.to_pickle, 'wb') as f:
+        with atop_profile.stage('pickle save'), open(args.to_pickle, 'wb') as f:
             pickle.dump(report, f)
 
     if args.to_png or args.interactive:
+        if not args.interactive:
+            import matplotlib
+            matplotlib.use('Agg')  # just a png, no GUI backend needed
+        from matplotlib_plotter import MatplotlibPlotter
         plotter = MatplotlibPlotter(report)
-        plotter.plot(args.interactive, args.to_png)
+        plotter.plot(args.interactive, args.to_png, args.follow)
 
 
 def parse_args():
     import argparse
+    from process_store import AGGREGATIONS
     parser = argparse.ArgumentParser()
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument('-atop', help='path to the atop file')
-    input_group.add_argument('-pickle', help='path to pickle file')
+    input_group.add_argument('-batch', help='directory or glob pattern of atop files (e.g. daily logs), '
+                                            'parsed in parallel and merged into one report')
+    input_group.add_argument('-report', help='path to report directory')
+    input_group.add_argument('-pickle', help='path to pickle file (legacy, prefer -report)')
 
     parser.add_argument('-to_png', help='path to the png file')
-    parser.add_argument('-to_pickle', help='path to pickle')
+    parser.add_argument('-to_report', help='path to report directory')
+    parser.add_argument('-to_pickle', help='path to pickle (legacy, prefer -to_report)')
     parser.add_argument('-i', '--interactive', help='open interactive plot', action='store_true')
     parser.add_argument('-timeline', help='path to a file used to generate timeline')
+    parser.add_argument('-workers', help='number of atopsar runs the reports are split into, run concurrently '
+                                         '(with -batch, number of files parsed in parallel)', type=int, default=1)
+    parser.add_argument('-memory_limit', help='with -batch, estimated memory of the files parsed at once in MB',
+                        type=int, default=atop_batch.DEFAULT_MEMORY_LIMIT >> 20)
+    parser.add_argument('-cache_dir', help='directory of the cache of parsed atop files', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('-cache_size', help='maximal size of the cache in MB', type=int,
+                        default=DEFAULT_CACHE_SIZE >> 20)
+    parser.add_argument('-no_cache', help='always parse the atop file, do not use the cache', action='store_true')
+    parser.add_argument('-follow', help='with -atop and -i, add new samples of the atop file every FOLLOW seconds',
+                        type=float)
+    parser.add_argument('-process_store', help='path to a process store (see process_info.py -store), plots the '
+                                               'processes of -process_names as another resource')
+    parser.add_argument('-process_names', help='with -process_store, names of the plotted processes', nargs='+')
+    parser.add_argument('-process_field', help='with -process_store, plotted field (e.g. mem-res-kbytes, or cpu)',
+                        default='mem-res-kbytes')
+    parser.add_argument('-process_agg', help='with -process_store, aggregation of the processes of a name',
+                        choices=AGGREGATIONS, default='sum')
+    parser.add_argument('-profile', help='path to a json file with the time and memory of each stage')
+    parser.add_argument('-profile_cprofile', help='with -profile, also capture cProfile statistics',
+                        action='store_true')
+    parser.add_argument('-profile_memory', help='with -profile, also trace memory allocations (slow)',
+                        action='store_true')
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.follow and not (args.atop and args.interactive):
+        parser.error('-follow requires -atop and -i')
+    if bool(args.process_store) != bool(args.process_names):
+        parser.error('-process_store and -process_names go together')
+    return args
 
 
 if __name__ == '__main__':
-    main(parse_args())
+    args = parse_args()
+    if args.profile:
+        atop_profile.start(args.profile_cprofile, args.profile_memory)
+    try:
+        main(args)
+    finally:
+        if args.profile:
+            atop_profile.write(args.profile)
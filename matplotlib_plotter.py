@@ -1,19 +1,32 @@
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import atop_profile
+import atop_time
+from bisect import bisect_left
+from datetime import timedelta
 from atop_constants import *
 from matplotlib.ticker import AutoMinorLocator
 import matplotlib.dates as mdates
 from atop_report import AtopReport
+from line_decimator import LineDecimator
 
 
 class MatplotlibPlotter:
     def __init__(self, report: AtopReport):
         self.report = report
-        self.annotation_texts = {p.time: p for p in report.processes}
+        self.process_times = []  # epoch of the process snapshots (see AtopProcesses), sorted
+        self.annotation_texts = {}  # index to process_times: rendered text
+        self.__index_processes()
         self.last_event_xy = ()
         self.last_annotation = None
         self.fig = None
         self.ctrl_pushed = False
         self.timeline_ax = None
+        self.resource_axes = {}  # resource name: (axis, twin axis or None)
+        self.timer = None
+        self.decimator = LineDecimator()
+        self.background = None  # figure without the annotation, see __draw_annotation
 
     def __add_annotation(self, ax):
         self.last_annotation = ax.annotate("", xy=(0, 0), xytext=(-20, 20),
@@ -27,9 +40,29 @@ class MatplotlibPlotter:
         text = ax.texts[0] # not sure about this ...
         ax.figure.texts.append(text) # https://stackoverflow.com/a/75722122
         self.last_annotation.set_visible(False)
+        # drawn separately on top of the cached figure, see __draw_annotation. Without blitting, it is an ordinary
+        # artist drawn with the rest of the figure (animated artists are skipped by a full draw)
+        self.last_annotation.set_animated(ax.figure.canvas.supports_blit)
+
+    @staticmethod
+    def __to_datenum(epoch):
+        # matplotlib dates of the local time
+        local = atop_time.epoch_to_local(epoch)
+        return mdates.date2num(np.datetime64(0, 's')) + local / atop_time.DAY
+
+    @staticmethod
+    def __to_epoch(datenum):
+        local = round((datenum - mdates.date2num(np.datetime64(0, 's'))) * atop_time.DAY)
+        return int(atop_time.local_to_epoch(local))
+
+    def __to_plot_data(self, data):
+        # indexed by matplotlib dates
+        return data.set_index(pd.Index(self.__to_datenum(data[ATOP_TIMESTAMP].values))).drop(columns=ATOP_TIMESTAMP)
 
     def __set(self, ax, ylabel, data):
-        data.set_index(ATOP_TIMESTAMP).plot(ax=ax)
+        self.__to_plot_data(data).plot(ax=ax)
+        for line in ax.get_lines():
+            self.decimator.add(line)
         ax.set_ylabel(ylabel)
         ax.set_picker(True)
         self.__set_grid(ax)
@@ -46,14 +79,21 @@ class MatplotlibPlotter:
     def __set2(self, ax, ylabel, data):
         ax2 = ax.twinx()
         ax2.set_picker(True)
-        ax2._get_lines.prop_cycler = ax._get_lines.prop_cycler
-        data.set_index(ATOP_TIMESTAMP).plot(ax=ax2)
+        # continue with the colors of the first axis
+        if hasattr(ax._get_lines, 'prop_cycler'):
+            ax2._get_lines.prop_cycler = ax._get_lines.prop_cycler
+        else:  # matplotlib >= 3.8
+            ax2._get_lines = ax._get_lines
+        self.__to_plot_data(data).plot(ax=ax2)
+        for line in ax2.get_lines():
+            self.decimator.add(line)
         ax2.set_ylabel(ylabel)
         lines, labels = ax.get_legend_handles_labels()
         lines2, labels2 = ax2.get_legend_handles_labels()
         ax.get_legend().remove()
         ax2.legend(lines + lines2, labels + labels2)
         self.__add_annotation(ax2)
+        return ax2
 
     def __on_key_press(self, event):
         if 'control' == event.key:
@@ -63,51 +103,51 @@ class MatplotlibPlotter:
         if 'control' == event.key:
             self.ctrl_pushed = False
 
-    def __show_process_annotation(self, time, time_num):
-        from datetime import datetime
-        def to_time(s):
-            return datetime.strptime(s, "%H:%M:%S")
-        key = to_time(time)
-        # find closes available timestamp in the data
-        closest_key = min(self.annotation_texts.keys(), key=lambda k: abs(to_time(k) - key))
-        text = str(self.annotation_texts[closest_key])
+    def __index_processes(self):
+        self.process_times = self.report.processes.get_times().tolist()
+        self.annotation_texts = {}
+
+    def __get_process_text(self, time):
+        if not self.process_times:
+            return ''
+        # find closest available timestamp in the data
+        key = time
+        i = bisect_left(self.process_times, key)
+        if i == len(self.process_times) or (i > 0 and key - self.process_times[i - 1] <= self.process_times[i] - key):
+            i -= 1
+        if i not in self.annotation_texts:
+            self.annotation_texts[i] = str(self.report.processes.get(self.process_times[i]))
+        return self.annotation_texts[i]
+
+    def __show_process_annotation(self, time):
+        text = self.__get_process_text(time)
         if self.report.timeline is not None:
-            routines = [r[0] for r in self.__get_running_routine(time_num)]
+            routines = [r[0] for r in self.__get_running_routine(time)]
             text += f"""\n\nRoutines:\n{','.join(routines)}"""
         text += '\nPress Ctrl+Click to open atop'
         self.last_annotation.set_text(text)
         self.last_annotation.set_visible(True)
-        self.fig.canvas.draw_idle()
+        self.__draw_annotation()
 
-    def __get_running_routine(self, time_num, y=None):
-        timeline = self.report.timeline.timeline
-        candidates = [item for sublist in timeline.values() for item in sublist] if y is None else timeline.get(y)
-        if candidates is None:
-            return
-        routines = []
-        for c in candidates:
-            start = c[1][0]
-            duration = c[1][1]
-            end = start + duration
-            if start <= time_num <= end:
-                routines.append((c[0], start, end, duration))
-        return routines
+    def __get_running_routine(self, time, y=None):
+        timeline = self.report.timeline
+        if y is None:
+            return timeline.get_running_routines(time)
+        return timeline.get_lane_routines(time, y)
 
     def __show_timeline_annotation(self, time, y):
-        def to_str(t):
-            return mdates.num2date(t).time().replace(microsecond=0)
         routines = self.__get_running_routine(time, y)
         if 0 == len(routines):
             return
         if 1 == len(routines):
             r = routines[0]
             text = f'{r[0]}\n' \
-                   f'   Start: {to_str(r[1])}\n' \
-                   f'     End: {to_str(r[2])}\n' \
-                   f'Duration: {to_str(r[3])}'
+                   f'   Start: {atop_time.format_time(r[1])}\n' \
+                   f'     End: {atop_time.format_time(r[2])}\n' \
+                   f'Duration: {timedelta(seconds=int(r[3]))}'
             self.last_annotation.set_text(text)
             self.last_annotation.set_visible(True)
-            self.fig.canvas.draw_idle()
+            self.__draw_annotation()
 
     def __open_atop(self, time):
         import distutils.spawn
@@ -124,10 +164,10 @@ class MatplotlibPlotter:
         if text:
             self.last_annotation.set_text(text)
             self.last_annotation.set_visible(True)
-            self.fig.canvas.draw_idle()
+            self.__draw_annotation()
         else:
             self.ctrl_pushed = False  # otherwise if user releases Ctrl in terminal, we won't get the event
-            time = time[0:5].replace(':', '') # now the time format needs to be in HHMM format with no seconds
+            time = atop_time.format_time(time, '%H%M')  # HHMM format with no seconds
             subprocess.call(f'gnome-terminal --maximize -- atop -b {time} -r {file}', shell=True)
 
     def __on_pick(self, event):
@@ -136,32 +176,55 @@ class MatplotlibPlotter:
             return  # ignore multiple events at the same location
         self.last_event_xy = xy
         xydata = (event.mouseevent.xdata, event.mouseevent.ydata)
-        time = mdates.num2date(xydata[0]).strftime('%H:%M:%S')
+        time = self.__to_epoch(xydata[0])
         self.last_annotation.xy = xy
         if self.ctrl_pushed:
             self.__open_atop(time)
         elif event.artist == self.timeline_ax:
-            self.__show_timeline_annotation(xydata[0], round(xydata[1]))
+            self.__show_timeline_annotation(time, round(xydata[1]))
         else:
-            self.__show_process_annotation(time, xydata[0])
+            self.__show_process_annotation(time)
 
     def __on_figure_leave(self, event):
         if self.last_annotation is not None and self.last_annotation.get_visible():
             self.last_annotation.set_visible(False)
-            self.fig.canvas.draw_idle()
+            self.__draw_annotation()
+
+    def __on_draw(self, event):
+        # full redraw (resize, zoom, new data), cache the figure without the annotation
+        canvas = self.fig.canvas
+        if canvas.supports_blit:
+            self.background = canvas.copy_from_bbox(self.fig.bbox)
+            if self.last_annotation is not None and self.last_annotation.get_visible():
+                self.fig.draw_artist(self.last_annotation)
+
+    def __draw_annotation(self):
+        # redraw only the annotation, instead of all the axes and lines of the figure
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self.background)
+        if self.last_annotation.get_visible():
+            self.fig.draw_artist(self.last_annotation)
+        canvas.blit(self.fig.bbox)
 
     def __register_events(self):
         self.fig.canvas.mpl_connect('pick_event', self.__on_pick)
         self.fig.canvas.mpl_connect('figure_leave_event', self.__on_figure_leave)
         self.fig.canvas.mpl_connect('key_press_event', self.__on_key_press)
         self.fig.canvas.mpl_connect('key_release_event', self.__on_key_release)
+        self.fig.canvas.mpl_connect('resize_event', lambda _: self.decimator.refresh())
+        self.fig.canvas.mpl_connect('draw_event', self.__on_draw)
 
     def __set_timeline(self, ax):
         colors = plt.rcParams['axes.prop_cycle'].by_key()['color'][:2]
         ax.set_title('Routines', loc='left')
         for k, v in self.report.timeline.timeline.items():
-            x_vals = [i[1] for i in v]
-            ax.broken_barh(x_vals, (k, 0.5), facecolors=colors)
+            starts = np.array([i[1][0] for i in v])
+            ends = starts + [i[1][1] for i in v]
+            starts, ends = self.__to_datenum(starts), self.__to_datenum(ends)
+            ax.broken_barh(list(zip(starts, ends - starts)), (k, 0.5), facecolors=colors)
         self.__set_grid(ax)
         ax.get_yaxis().set_visible(False)
         self.timeline_ax = ax
@@ -171,27 +234,68 @@ class MatplotlibPlotter:
         ax.grid(True, which='major')
         ax.grid(True, which='minor', alpha=0.2)
 
-    def plot(self, interactive, destination):
+    def __update_lines(self, ax, data):
+        x = self.__to_datenum(data[ATOP_TIMESTAMP].values)
+        lines = [line for line in ax.get_lines() if line.get_label() in data]
+        # rescale to the full data first, then draw only what is visible
+        for line in lines:
+            line.set_data(x, data[line.get_label()].values)
+        ax.relim()
+        ax.autoscale_view()
+        for line in lines:
+            self.decimator.set_data(line, x, data[line.get_label()].values)
+
+    def update(self):
+        # redraw the figure in place with the current data of the report
+        for r in self.report.resources:
+            axes = self.resource_axes.get(r.name)
+            if axes is None:
+                continue  # new resource, it will be shown once the report is plotted again
+            self.__update_lines(axes[0], r.data)
+            if axes[1] is not None and r.data_opt is not None:
+                self.__update_lines(axes[1], r.data_opt)
+        self.__index_processes()
+        self.fig.canvas.draw_idle()
+
+    def __follow(self):
+        if self.report.update():
+            self.update()
+
+    def plot(self, interactive, destination, follow=None):
         resources = self.report.resources
         plt.rcParams.update({'font.family': 'monospace'})
         no_of_timelines = 0 if self.report.timeline is None else 1
         nrows = no_of_timelines + len(resources)
-        self.fig, axes = plt.subplots(nrows=nrows, ncols=1, sharex='col')
-        self.fig.suptitle(self.report.file)
-        for i, r in enumerate(sorted(resources)):
-            ax = axes[i]
-            ax.set_title(r.name, loc='left')
-            self.__set(ax, r.unit, r.data)
-            if r.data_opt is not None:
-                self.__set2(ax, r.data_opt_unit, r.data_opt)
-
-        if self.report.timeline:
-            self.__set_timeline(axes[-1])
-
-        self.__set_xaxis(axes[-1])  # set common properties of X axis
-        self.fig.set_size_inches(20, nrows * 2.5)
-        self.__register_events()
+        with atop_profile.stage('plot figure') as s:
+            self.fig, axes = plt.subplots(nrows=nrows, ncols=1, sharex='col')
+            self.fig.suptitle(self.report.file)
+            for i, r in enumerate(sorted(resources)):
+                ax = axes[i]
+                ax.set_title(r.name, loc='left')
+                self.__set(ax, r.unit, r.data)
+                ax2 = None
+                if r.data_opt is not None:
+                    ax2 = self.__set2(ax, r.data_opt_unit, r.data_opt)
+                self.resource_axes[r.name] = (ax, ax2)
+
+            if self.report.timeline:
+                self.__set_timeline(axes[-1])
+
+            self.__set_xaxis(axes[-1])  # set common properties of X axis
+            self.fig.set_size_inches(20, nrows * 2.5)
+            self.__register_events()
+            s.rows = sum(len(x) for x, _ in self.decimator.lines.values())
         if destination:
-            plt.savefig(destination, dpi=300, bbox_inches='tight')
+            with atop_profile.stage('plot savefig') as s:
+                dpi = 300
+                self.decimator.refresh(dpi / self.fig.dpi)
+                plt.savefig(destination, dpi=dpi, bbox_inches='tight')
+                s.rows = sum(len(line.get_xdata()) for line in self.decimator.lines)
+        self.decimator.refresh(1)
         if interactive:
+            if follow:
+                # re-read the file periodically, e.g. while atop is still writing it
+                self.timer = self.fig.canvas.new_timer(interval=int(follow * 1000))
+                self.timer.add_callback(self.__follow)
+                self.timer.start()
             plt.show()
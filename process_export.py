@@ -0,0 +1,104 @@
+import os
+import numpy as np
+
+# Exporters of the process statistics (see process_info.get_statistics), written chunk by chunk:
+# write(df) is called with the statistics of each chunk of processes as soon as it is aggregated,
+# close(overview) with the per name overview at the end, so the statistics of all processes are never held at once.
+EXCEL_MAX_ROWS = 1 << 20  # including the header
+
+
+class CsvExporter:
+    # dest with the processes, the overview goes next to it (dest_overview.csv)
+    def __init__(self, dest):
+        self.dest = dest
+        self.file = open(dest, 'w', newline='')
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self, overview):
+        self.file.close()
+        overview.to_csv(f'{os.path.splitext(self.dest)[0]}_overview.csv')
+
+
+class ParquetExporter:
+    # dest with the processes in a row group per chunk, the overview goes next to it (dest_overview.parquet)
+    # statistics are stored as floats, the type of a column must not change between the chunks
+    INT_COLUMNS = ['pid', 'start', 'tgid']
+
+    def __init__(self, dest):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Parquet export needs pyarrow, install it or use another format')
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.dest = dest
+        self.writer = None
+
+    def __to_table(self, df):
+        df = df.astype({c: np.float64 for c in df.columns
+                        if (c not in self.INT_COLUMNS and df[c].dtype.kind in 'biuf') or c == 'end'})
+        return self.pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(self, df):
+        table = self.__to_table(df)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.dest, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self, overview):
+        if self.writer is not None:
+            self.writer.close()
+        self.pq.write_table(self.pa.Table.from_pandas(overview.reset_index()),
+                            f'{os.path.splitext(self.dest)[0]}_overview.parquet')
+
+
+class XlsxExporter:
+    # Workbook with the overview and processes sheets, rows are streamed to the file (openpyxl write-only mode).
+    # Processes over the row limit of Excel continue in processes_2, processes_3...
+    def __init__(self, dest):
+        from openpyxl import Workbook
+        self.dest = dest
+        self.workbook = Workbook(write_only=True)
+        self.overview = self.workbook.create_sheet('overview')
+        self.sheets = 0
+        self.sheet = None
+        self.rows = 0
+
+    def __add_sheet(self, columns):
+        self.sheets += 1
+        self.sheet = self.workbook.create_sheet('processes' if self.sheets == 1 else f'processes_{self.sheets}')
+        self.sheet.append(list(columns))
+        self.rows = 1
+
+    @staticmethod
+    def __get_rows(df):
+        # NaN as empty cells
+        return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+    def write(self, df):
+        for row in self.__get_rows(df):
+            if self.sheet is None or self.rows >= EXCEL_MAX_ROWS:
+                self.__add_sheet(df.columns)
+            self.sheet.append(row)
+            self.rows += 1
+
+    def close(self, overview):
+        overview = overview.reset_index()
+        self.overview.append(list(overview.columns))
+        for row in self.__get_rows(overview):
+            self.overview.append(row)
+        self.workbook.save(self.dest)
+
+
+EXPORTERS = {'xlsx': XlsxExporter, 'csv': CsvExporter, 'parquet': ParquetExporter}
+
+
+def get_format(dest):
+    # by the extension of dest, xlsx by default
+    extension = os.path.splitext(dest)[1].lstrip('.').lower()
+    return extension if extension in EXPORTERS else 'xlsx'
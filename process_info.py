@@ -1,9 +1,14 @@
-import subprocess
+import numpy as np
 import pandas as pd
 import logging
 import re
-import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+import atop_profile
+import atop_raw
 from atop_constants import *
+from atop_stream import AtopStream
 
 # since Python 3.6, dicts keep insertion order
 assert sys.version_info >= (3, 6)
@@ -11,32 +16,23 @@ assert sys.version_info >= (3, 6)
 LOGGER = logging.getLogger()
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
+PROCESS_ID = 'process'
 
-def __run(cmd):
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-    log = []
-    while True:
-        line = p.stdout.readline()
-        try:
-            output = line.decode("utf-8").rstrip('\n')
-            if output == '' and p.poll() is not None:
-                break
-            if '' == output:
-                continue
-            log.append(output)
-        except UnicodeError as e:
-            LOGGER.error(f'Error parsing line. Line will be skipped: {line}\nReason: {e}')
-            continue
 
-    return 0 == p.poll(), log
+class ProcessParseError(Exception):
+    pass
 
 
-class ProcessInfo:
-    __ids = {}
+class ProcessIds:
+    # Identifies processes of a single parse, as pids are reused.
+    # For each pid, start times are kept sorted (oldest first) together with the ids of the processes started then,
+    # so the process running at a given time is found by bisection.
+    def __init__(self):
+        self.__starts = {}
+        self.__ids = {}
+        self.__last_id = -1
 
-    @staticmethod
-    def create_id(pid, start, time):
-        v = ProcessInfo.__ids.setdefault(pid, {})
+    def create_id(self, pid, start, time):
         # sometimes there might be discrepancy between the current time and the start time, example:
         #                V                                                             V
         # PRG david 1606905905 2020/12/02 11:45:05 1 4066 (atopgpud) S 0 0 996 1 0 1606905906 () 1 0 1 0 0 0 0 0 0 0 0 n 0 0 -
@@ -44,20 +40,28 @@ class ProcessInfo:
         if start > time:
             LOGGER.warning(f'start time {start} for pid {pid} is later than the current time {time}')
             t = time
-        v[t] = uuid.uuid4()
-        # store start times sorted from the newest (biggest) to smallest
-        # keep insertion order
-        ProcessInfo.__ids[pid] = dict(sorted(v.items(), key=lambda item: item[0], reverse=True))
-        return v[t]
-
-    @staticmethod
-    def get_id(pid, time):
-        start_times = ProcessInfo.__ids.get(pid, {}).keys()
-        if not start_times:
+        self.__last_id += 1
+        starts = self.__starts.setdefault(pid, [])
+        ids = self.__ids.setdefault(pid, [])
+        i = bisect_left(starts, t)
+        if i < len(starts) and starts[i] == t:
+            ids[i] = self.__last_id
+        else:
+            starts.insert(i, t)
+            ids.insert(i, self.__last_id)
+        return self.__last_id
+
+    def get_id(self, pid, time):
+        starts = self.__starts.get(pid)
+        if not starts:
             return None
         # find the most recent start time before the current time
-        start = next(t for t in start_times if time >= t)
-        return ProcessInfo.__ids[pid][start]
+        i = bisect_right(starts, time)
+        return self.__ids[pid][i - 1] if i else None
+
+
+class ProcessInfo:
+    __slots__ = ('pid', 'name', 'command', 'start', 'end', 'tgid')
 
     def __init__(self, pid, name, command, start, tgid):
         self.pid = pid
@@ -65,26 +69,74 @@ class ProcessInfo:
         self.command = command
         self.start = start  # epoch
         self.end = None  # epoch
-        self.records = {}
         self.tgid = tgid
 
-    def update(self, time, data: dict):
-        if time not in self.records:
-            self.records[time] = data
-        else:
-            self.records[time].update(data)
-
     def set_end(self, end):
         self.end = end
 
-    def get_end(self):
-        if self.end:
-            return self.end
-        # assume process finished after last record
-        return max(self.records.keys()) + 1
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
 
     def __repr__(self):
-        return str(vars(self))
+        return str(self.to_dict())
+
+
+class ProcessRecords:
+    # Records of all processes of a single parse, one table per label.
+    # Each table is a flat int64 array filled row after row with the process id, epoch and the label's fields,
+    # i.e. 8 bytes per value instead of a dict per record.
+    def __init__(self):
+        self.__fields = {}
+        self.__tables = {}
+
+    def add_label(self, label, fields):
+        self.__fields[label] = fields
+        self.__tables[label] = array('q')
+
+    def append(self, label, row):
+        self.__tables[label].extend(row)
+
+    def append_rows(self, label, values):
+        # values: numpy array with a row per record
+        self.__tables[label].frombytes(np.ascontiguousarray(values, dtype=np.int64).tobytes())
+
+    def extend(self, records, ids):
+        # append all records of another parse, with its process ids translated by ids (numpy array)
+        for label, fields in records.__fields.items():
+            if label not in self.__tables:
+                self.add_label(label, fields)
+            values = np.array(records.__tables[label], dtype=np.int64).reshape(-1, len(fields) + 2)
+            values[:, 0] = ids[values[:, 0]]
+            self.append_rows(label, values)
+
+    def __len__(self):
+        return sum(len(t) // (len(self.__fields[k]) + 2) for k, t in self.__tables.items())
+
+    def get_table(self, label):
+        cols = [PROCESS_ID, 'epoch'] + self.__fields[label]
+        values = np.array(self.__tables[label], dtype=np.int64).reshape(-1, len(cols))
+        # the same label printed twice for a process in one interval, keep the last one
+        return pd.DataFrame(values, columns=cols).drop_duplicates([PROCESS_ID, 'epoch'], keep='last')
+
+    def get_ranges(self, bounds):
+        # split the tables by ranges of process ids, bounds[i] <= id < bounds[i + 1]
+        tables = {}
+        for label in self.__tables:
+            t = self.get_table(label).sort_values(PROCESS_ID, kind='stable')
+            tables[label] = (t, np.searchsorted(t[PROCESS_ID].to_numpy(), bounds))
+        for i in range(len(bounds) - 1):
+            yield {label: t.iloc[p[i]:p[i + 1]] for label, (t, p) in tables.items()}
+
+    def to_frame(self):
+        return merge_tables({label: self.get_table(label) for label in self.__tables})
+
+
+def merge_tables(tables):
+    # one row per process and epoch, with the fields of all labels
+    result = None
+    for table in tables.values():
+        result = table if result is None else result.merge(table, how='outer', on=[PROCESS_ID, 'epoch'])
+    return result
 
 
 def get_tokens(info, tokens):
@@ -112,170 +164,419 @@ def get_max_split(field_info):
     return max_index + 1  # we need n+1 splits to get nth item (due to zero indexing)
 
 
-def parse_general(file, label, max_split):
-    success, log = __run(f'atop -r {file} -P {label}')
-    if not success:
-        LOGGER.critical(f'Could not obtain process data for file {file} and label {label}')
-        exit(-1)
+def parse_general(file, max_splits, stats=None):
+    labels = list(max_splits)
     # split on space, except when it's between brackets
     pattern = re.compile(r'\s+(?=[^()]*(?:\(|$))')
     first_sep_found = False
-    for line in log:
-        # data till first separator contain data since boot (which we don't want)
-        if not first_sep_found:
-            if line.startswith(SEP):
-                first_sep_found = True
-            continue
-        if line.startswith(SEP) or line.startswith(RESET):
-            continue
-        if not line.startswith(label):
-            LOGGER.error(f'Unexpected line format in file {file}: label \'{label}\' expected '
-                         f'as a first token, instead got \'{line}\'')
-            continue
-        tokens = pattern.split(line, maxsplit=max_split)
-        yield tokens
-
-
-def parse_prg(file):
-    processes = {}
+    sample = {}
+    cmd = f'atop -r {file} -P {",".join(labels)}'
+    # samples are yielded as soon as atop prints them, the output is never held as a whole
+    with AtopStream(cmd) as stream:
+        for line in stream:
+            # data till first separator contain data since boot (which we don't want)
+            if not first_sep_found:
+                if line.startswith(SEP):
+                    first_sep_found = True
+                continue
+            if line.startswith(SEP) or line.startswith(RESET):
+                # all labels of one sample are between two separators
+                if sample:
+                    yield sample
+                sample = {}
+                continue
+            label = line[:3]
+            if label not in max_splits:
+                LOGGER.error(f'Unexpected line format in file {file}: one of labels {labels} expected '
+                             f'as a first token, instead got \'{line}\'')
+                continue
+            sample.setdefault(label, []).append(pattern.split(line, maxsplit=max_splits[label]))
+    if stats is not None:
+        stats['subprocess_wait_s'] = stream.wait_time
+        stats['lines'] = stream.lines
+    if not stream.success:
+        raise ProcessParseError(f'Could not obtain process data for file {file} and labels {labels}')
+    if sample:
+        yield sample
+
+
+def update_process(processes, ids, pid, start, epoch, name, command, tgid, state):
+    process_id = ids.get_id(pid, epoch)
+    # a newer start than the one of the process found means the pid was reused
+    if process_id is None or start > processes[process_id].start:
+        process_id = ids.create_id(pid, start, epoch)
+    process = processes.setdefault(process_id, ProcessInfo(pid, name, command, start, tgid))
+    if 'E' in state:
+        process.set_end(epoch)
+    return process_id
+
+
+def get_prg_updater(processes, ids):
     fields_to_extract = ['pid', 'start', 'epoch', 'name', 'command', 'tgid', 'state']
     info = get_field_info(fields_to_extract, PRG_FIELDS, PRG_FIELDS_BETWEEN_BRACKETS)
-    max_split = get_max_split(info)
-    for tokens in parse_general(file, 'PRG', max_split):
-        d = get_tokens(info, tokens)
-        pid = d['pid']
-        start = d['start']
-        epoch = d['epoch']
-        puuid = ProcessInfo.get_id(pid, epoch) or ProcessInfo.create_id(pid, start, epoch)
-        process = processes.setdefault(puuid, ProcessInfo(pid, d['name'], d['command'], start, d['tgid']))
-        if 'E' in d['state']:
-            process.set_end(epoch)
-    LOGGER.debug(f'Detected {len(processes)} processes')
-    return processes
-
-
-def update_general(file, processes, label, fields, all_fields, fields_between_brackets):
-    def kv(k):
-        return k, data[k]
-    fields_to_extract = fields + ['epoch', 'pid']
-    info = get_field_info(fields_to_extract, all_fields, fields_between_brackets)
-    max_split = get_max_split(info)
-    for tokens in parse_general(file, label, max_split):
-        data = get_tokens(info, tokens)
-        pid = data['pid']
-        epoch = data['epoch']
-        processes.get(ProcessInfo.get_id(pid, epoch)).update(epoch, dict(map(kv, fields)))
-    LOGGER.debug(f'update {label} done')
-
-
-def update_prc(file, processes):
-    update_general(file, processes, 'PRC', ['clock-ticks', 'cpu-usr', 'cpu-sys', 'sleep-avg'],
-                   PRC_FIELDS, PRC_FIELDS_BETWEEN_BRACKETS)
-
-
-def update_prm(file, processes):
-    update_general(file, processes, 'PRM', ['mem-virt-kbytes', 'mem-res-kbytes',
-                                            'mem-virt-growth-kbytes', 'mem-res-growth-kbytes',
-                                            'page-faults-minor', 'page-faults-major',
-                                            'data-size-kbytes', 'swap-kbytes'],
-                   PRM_FIELDS, PRM_FIELDS_BETWEEN_BRACKETS)
-
-
-def update_pre(file, processes):
-    update_general(file, processes, 'PRE', ['busy', 'mem-busy', 'mem-util-kb'],
-                   PRE_FIELDS, PRE_FIELDS_BETWEEN_BRACKETS)
-
-
-def update_prd(file, processes):
-    update_general(file, processes, 'PRD', ['read-sectors', 'write-sectors', 'write-cancelled'],
-                   PRD_FIELDS, PRD_FIELDS_BETWEEN_BRACKETS)
 
+    def update(tokens):
+        d = get_tokens(info, tokens)
+        update_process(processes, ids, d['pid'], d['start'], d['epoch'], d['name'], d['command'], d['tgid'],
+                       d['state'])
+    return get_max_split(info), update
+
+
+def get_general_updater(processes, ids, records, label, fields, all_fields, fields_between_brackets):
+    info = get_field_info(['pid', 'epoch'] + fields, all_fields, fields_between_brackets)
+    records.add_label(label, fields)
+
+    def update(tokens):
+        # all extracted fields are numbers, see get_tokens for the general case
+        row = [v[2](tokens[v[0]]) for v in info.values()]
+        process_id = ids.get_id(row[0], row[1])
+        if process_id is None:
+            return  # record of a process not reported by PRG
+        row[0] = process_id
+        records.append(label, row)
+    return get_max_split(info), update
+
+
+def get_prc_updater(processes, ids, records):
+    return get_general_updater(processes, ids, records, 'PRC', ['clock-ticks', 'cpu-usr', 'cpu-sys', 'sleep-avg'],
+                               PRC_FIELDS, PRC_FIELDS_BETWEEN_BRACKETS)
+
+
+def get_prm_updater(processes, ids, records):
+    return get_general_updater(processes, ids, records, 'PRM', ['mem-virt-kbytes', 'mem-res-kbytes',
+                                                                'mem-virt-growth-kbytes', 'mem-res-growth-kbytes',
+                                                                'page-faults-minor', 'page-faults-major',
+                                                                'data-size-kbytes', 'swap-kbytes'],
+                               PRM_FIELDS, PRM_FIELDS_BETWEEN_BRACKETS)
+
+
+def get_pre_updater(processes, ids, records):
+    return get_general_updater(processes, ids, records, 'PRE', ['busy', 'mem-busy', 'mem-util-kb'],
+                               PRE_FIELDS, PRE_FIELDS_BETWEEN_BRACKETS)
+
+
+def get_prd_updater(processes, ids, records):
+    return get_general_updater(processes, ids, records, 'PRD', ['read-sectors', 'write-sectors', 'write-cancelled'],
+                               PRD_FIELDS, PRD_FIELDS_BETWEEN_BRACKETS)
+
+
+# fields of the labels (see the updaters) decoded from struct tstat of a raw file, None is the clock ticks of the file
+RAW_FIELDS = {'PRC': [None, ('cpu', 'utime'), ('cpu', 'stime'), ('cpu', 'sleepavg')],
+              'PRM': [('mem', 'vmem'), ('mem', 'rmem'), ('mem', 'vgrow'), ('mem', 'rgrow'), ('mem', 'minflt'),
+                      ('mem', 'majflt'), ('mem', 'vdata'), ('mem', 'vswap')],
+              'PRE': [('gpu', 'gpubusy'), ('gpu', 'membusy'), ('gpu', 'memcum')],
+              'PRD': [('dsk', 'rsz'), ('dsk', 'wsz'), ('dsk', 'cwsz')]}
+
+
+def decode(value):
+    return value.decode('utf-8', 'replace')
+
+
+class ProcessParser:
+    # State of a parse: the processes, their ids and records, filled sample by sample.
+    # With native, the raw file is decoded directly (see atop_raw) instead of parsing the output of atop -P.
+    def __init__(self, native=False):
+        self.native = native
+        self.processes = {}
+        self.ids = ProcessIds()
+        self.records = ProcessRecords()
+        # PRG has to go first, the other labels are assigned to the processes it creates
+        self.__updaters = {'PRG': get_prg_updater(self.processes, self.ids),
+                           'PRC': get_prc_updater(self.processes, self.ids, self.records),
+                           'PRM': get_prm_updater(self.processes, self.ids, self.records),
+                           'PRE': get_pre_updater(self.processes, self.ids, self.records),
+                           'PRD': get_prd_updater(self.processes, self.ids, self.records)}
+
+    def parse(self, file):
+        if self.native:
+            return self.parse_raw(file)
+        max_splits = {label: u[0] for label, u in self.__updaters.items()}
+        # single atop run for all labels, split by label per sample
+        with atop_profile.stage('atop -P parse') as s:
+            records = len(self.records)
+            for sample in parse_general(file, max_splits, stats=s.values):
+                for label, (_, update) in self.__updaters.items():
+                    for tokens in sample.get(label, ()):
+                        update(tokens)
+            s.rows = len(self.records) - records
+        LOGGER.debug(f'Detected {len(self.processes)} processes with {len(self.records)} records')
+        return self.processes, self.records
+
+    def parse_raw(self, file):
+        # raises atop_raw.RawFormatError if the file can't be decoded
+        with atop_profile.stage('atop raw parse') as s:
+            records = len(self.records)
+            raw = atop_raw.RawFile(file)
+            raw.get_tstat_dtype()
+            samples = raw.records()
+            next(samples, None)  # the first sample of the file is since boot
+            for sample in samples:
+                self.__add_tasks(sample.curtime, sample.get_tasks(), raw.hertz)
+            s.rows = len(self.records) - records
+        LOGGER.debug(f'Detected {len(self.processes)} processes with {len(self.records)} records')
+        return self.processes, self.records
+
+    def __add_tasks(self, epoch, tasks, hertz):
+        gen = tasks['gen']
+        process_ids = np.array([update_process(self.processes, self.ids, pid, start, epoch, decode(name),
+                                               decode(command or name), tgid, decode(state))
+                                for pid, start, name, command, tgid, state in
+                                zip(gen['pid'].tolist(), gen['btime'].tolist(), gen['name'].tolist(),
+                                    gen['cmdline'].tolist(), gen['tgid'].tolist(), gen['state'].tolist())],
+                               dtype=np.int64)
+        n = len(tasks)
+        for label, fields in RAW_FIELDS.items():
+            values = np.empty((n, len(fields) + 2), dtype=np.int64)
+            values[:, 0] = process_ids
+            values[:, 1] = epoch
+            for i, field in enumerate(fields, 2):
+                values[:, i] = hertz if field is None else tasks[field[0]][field[1]]
+            self.records.append_rows(label, values)
+
+
+def parse(file, native=False):
+    if native:
+        try:
+            return ProcessParser(native=True).parse(file)
+        except atop_raw.RawFormatError as e:
+            LOGGER.warning(f'{e}, using atop instead')
+    return ProcessParser().parse(file)
 
-def get_statistics(processes, dest):
-    import numpy as np
 
-    def store(d, metric):
-        if type(d) is pd.DataFrame or type(d) is pd.Series:
-            for field, value in d.items():
-                setattr(v, f'{field}-{metric}', value)
-        else:
-            setattr(v, f'{metric}', d)
-
-    LOGGER.debug(f'Computing statistics')
-    for k, v in processes.items():
-        data = v.records
-        if data:  # skip empty data
-            df = pd.DataFrame.from_dict(data, orient='index')
-            # CPU part
-            store(df[['cpu-usr', 'cpu-sys']].values.sum(), 'cpu-sum')
-            store(df[['cpu-usr', 'cpu-sys']].count(), 'intervals')
-            store(df[['cpu-usr', 'cpu-sys', 'sleep-avg']].sum(), 'sum')
-
-            # RAM part
-            store(df[['mem-virt-kbytes', 'mem-res-kbytes', 'swap-kbytes', 'data-size-kbytes',
-                      'page-faults-minor', 'page-faults-major']].max(), 'max')
-            store(df[['mem-virt-kbytes', 'mem-res-kbytes', 'swap-kbytes', 'data-size-kbytes',
-                      'page-faults-minor', 'page-faults-major']].sum(), 'sum')
-
-            store(df[['mem-virt-growth-kbytes', 'mem-res-growth-kbytes']].abs().sum(), '(de)allocation-sum')
-            store(df[['mem-virt-growth-kbytes', 'mem-res-growth-kbytes']].abs().mean(), '(de)allocation-mean')
-            tmp = df[['mem-virt-growth-kbytes', 'mem-res-growth-kbytes']]
-            store(tmp[(tmp['mem-virt-growth-kbytes'] > 0)
-                      | (tmp['mem-res-growth-kbytes'] > 0)].sum(), 'allocation-sum')
-            store(tmp[(tmp['mem-virt-growth-kbytes'] < 0)
-                      | (tmp['mem-res-growth-kbytes'] < 0)].sum(), 'deallocation-sum')
-
-            # HDD part
-            store(df[['read-sectors', 'write-sectors', 'write-cancelled']].sum(), 'sum')
-
-            # GPU part
-            store(df[['busy', 'mem-busy', 'mem-util-kb']].sum(), 'sum')
-            store(df[['mem-util-kb']].max(), 'max')
-
-    def to_dict(r):
-        d = vars(r)
-        d['probable-duration'] = r.get_end() - r.start
-        d.pop('records')
-        return d
-    LOGGER.debug(f'Converting to excel')
-    df = pd.DataFrame.from_dict(to_dict(p) for p in processes.values())
-    aggfunc = {'probable-duration': sum}
-    for c in df.columns.values:
-        if '-sum' in c:
-            aggfunc[c] = np.sum
-        if '-max' in c:
-            aggfunc[c] = np.max
-        if '-mean' in c:
-            aggfunc[c] = np.mean
-    table = pd.pivot_table(df, index=['name'], aggfunc=aggfunc)
-    with pd.ExcelWriter(dest) as writer:
-        table.to_excel(writer, sheet_name='overview')
-        df.to_excel(writer, sheet_name='processes')
+def merge(parses):
+    # merge the (processes, records) of separately parsed files, e.g. daily logs, in the order of time.
+    # A process is identified by its pid and start time, so processes running over midnight are merged too.
+    processes = {}
+    records = ProcessRecords()
+    keys = {}  # (pid, start): process id
+    for file_processes, file_records in parses:
+        ids = np.full(max(file_processes, default=-1) + 1, -1, dtype=np.int64)
+        for i, p in file_processes.items():
+            key = (p.pid, p.start)
+            process_id = keys.get(key)
+            if process_id is None:
+                process_id = keys[key] = len(processes)
+                processes[process_id] = p
+            elif p.end is not None:
+                processes[process_id].set_end(p.end)
+            ids[i] = process_id
+        records.extend(file_records, ids)
+    LOGGER.debug(f'Merged {len(processes)} processes with {len(records)} records')
+    return processes, records
+
+
+CPU_FIELDS = ['cpu-usr', 'cpu-sys']
+MEM_FIELDS = ['mem-virt-kbytes', 'mem-res-kbytes', 'swap-kbytes', 'data-size-kbytes',
+              'page-faults-minor', 'page-faults-major']
+MEM_GROWTH_FIELDS = ['mem-virt-growth-kbytes', 'mem-res-growth-kbytes']
+DSK_FIELDS = ['read-sectors', 'write-sectors', 'write-cancelled']
+GPU_FIELDS = ['busy', 'mem-busy', 'mem-util-kb']
+
+
+def aggregate(tables):
+    df = merge_tables(tables)
+    # derived columns and named aggregations, computed in a single group by over all processes
+    columns = {PROCESS_ID: df[PROCESS_ID], 'epoch': df['epoch']}
+    aggs = {'last-record': ('epoch', 'max')}
+
+    # CPU part
+    columns['cpu'] = df['cpu-usr'] + df['cpu-sys']
+    columns['cpu-missing'] = columns['cpu'].isna()
+    aggs['cpu-sum'] = ('cpu', 'sum')
+    aggs['cpu-missing'] = ('cpu-missing', 'any')
+    for c in CPU_FIELDS:
+        columns[c] = df[c]
+        aggs[f'{c}-intervals'] = (c, 'count')
+    columns['sleep-avg'] = df['sleep-avg']
+    for c in CPU_FIELDS + ['sleep-avg']:
+        aggs[f'{c}-sum'] = (c, 'sum')
+
+    # RAM part
+    for c in MEM_FIELDS:
+        columns[c] = df[c]
+        aggs[f'{c}-max'] = (c, 'max')
+    for c in MEM_FIELDS:
+        aggs[f'{c}-sum'] = (c, 'sum')
+    growth = df[MEM_GROWTH_FIELDS]
+    allocated = (growth > 0).any(axis=1)
+    deallocated = (growth < 0).any(axis=1)
+    for c in MEM_GROWTH_FIELDS:
+        columns[f'{c}-abs'] = growth[c].abs()
+        columns[f'{c}-allocated'] = growth[c].where(allocated)
+        columns[f'{c}-deallocated'] = growth[c].where(deallocated)
+        aggs[f'{c}-(de)allocation-sum'] = (f'{c}-abs', 'sum')
+    for c in MEM_GROWTH_FIELDS:
+        aggs[f'{c}-(de)allocation-mean'] = (f'{c}-abs', 'mean')
+    for c in MEM_GROWTH_FIELDS:
+        aggs[f'{c}-allocation-sum'] = (f'{c}-allocated', 'sum')
+    for c in MEM_GROWTH_FIELDS:
+        aggs[f'{c}-deallocation-sum'] = (f'{c}-deallocated', 'sum')
+
+    # HDD and GPU part
+    for c in DSK_FIELDS + GPU_FIELDS:
+        columns[c] = df[c]
+        aggs[f'{c}-sum'] = (c, 'sum')
+    aggs['mem-util-kb-max'] = ('mem-util-kb', 'max')
+
+    result = pd.DataFrame(columns).groupby(PROCESS_ID).agg(**aggs)
+    # the total is not available if any of the intervals misses one of the values
+    result['cpu-sum'] = result['cpu-sum'].where(~result.pop('cpu-missing'))
+    return result
+
+
+CHUNK_PROCESSES = 1 << 16  # processes aggregated (and exported) at once
+
+
+def map_bounded(executor, function, items, window):
+    # executor.map in the order of items, with at most window items submitted at once
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_statistics(processes, records, workers=1, chunk_size=CHUNK_PROCESSES):
+    # statistics of chunks of processes in the order of their ids, a chunk can be written while the next ones are
+    # aggregated (in workers processes)
+    ids = np.array(sorted(processes), dtype=np.int64)
+    bounds = ids[::chunk_size].tolist() + [int(ids[-1]) + 1] if len(ids) else []
+    tables = records.get_ranges(bounds)
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = map_bounded(executor, aggregate, tables, 2 * workers)
+    else:
+        executor = None
+        results = map(aggregate, tables)
+    try:
+        for i, stats in enumerate(results):
+            chunk = ids[i * chunk_size:(i + 1) * chunk_size]
+            info = pd.DataFrame([processes[i].to_dict() for i in chunk.tolist()], index=chunk)
+            info['end'] = info['end'].astype(np.float64)  # NaN if unknown, in every chunk
+            last_record = stats.pop('last-record').reindex(info.index)
+            df = info.join(stats)
+            # assume process finished after last record, unless we know the end
+            end = info['end'].where(info['end'].fillna(0) != 0, last_record + 1)
+            df['probable-duration'] = end - info['start']
+            yield df.reset_index(drop=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+class Overview:
+    # Per name aggregation of the statistics, added chunk by chunk: sums of the sum columns, maxima of the max
+    # columns and means of the mean columns (from the sums and counts of the chunks).
+    # The same as pd.pivot_table(df, index=['name'], aggfunc={column: sum, max or mean}) of all chunks at once.
+    def __init__(self):
+        self.sums = []
+        self.counts = []
+        self.maxima = []
+        self.columns = None
+
+    def add(self, df):
+        if self.columns is None:
+            self.columns = {'probable-duration': 'sum'}
+            for c in df.columns.values:
+                for agg in ('sum', 'max', 'mean'):
+                    if f'-{agg}' in c:
+                        self.columns[c] = agg
+        groups = df.groupby('name')
+        summed = [c for c, agg in self.columns.items() if agg in ('sum', 'mean')]
+        self.sums.append(groups[summed].sum())
+        self.counts.append(groups[[c for c, agg in self.columns.items() if agg == 'mean']].count())
+        self.maxima.append(groups[[c for c, agg in self.columns.items() if agg == 'max']].max())
+
+    def get_table(self):
+        if self.columns is None:
+            return pd.DataFrame()
+        sums = pd.concat(self.sums).groupby(level=0).sum()
+        counts = pd.concat(self.counts).groupby(level=0).sum()
+        maxima = pd.concat(self.maxima).groupby(level=0).max()
+        table = sums.join(maxima)
+        for c in counts.columns:
+            table[c] = sums[c] / counts[c].replace(0, np.nan)
+        # columns without any value are left out, like pivot_table does
+        return table.dropna(axis=1, how='all')[sorted(c for c in self.columns if c in table)]
+
+
+def get_statistics(processes, records, dest, workers=1, format=None):
+    # statistics of all processes and their overview by name, written chunk by chunk (see process_export)
+    import process_export
+    exporter = process_export.EXPORTERS[format or process_export.get_format(dest)](dest)
+    overview = Overview()
+    with atop_profile.stage('statistics', len(records)) as s:
+        LOGGER.debug(f'Computing statistics and writing them to {dest}')
+        s.rows = 0
+        for df in iter_statistics(processes, records, workers):
+            overview.add(df)
+            exporter.write(df)
+            s.rows += len(df)
+    with atop_profile.stage('statistics overview') as s:
+        table = overview.get_table()
+        exporter.close(table)
+        s.rows = len(table)
 
 
 def main(args):
-    file = args.atop
     destination = args.dest
-    # get processes first
-    processes = parse_prg(file)
-    # get additional data
-    update_prc(file, processes)
-    update_prm(file, processes)
-    update_pre(file, processes)
-    update_prd(file, processes)
-    get_statistics(processes, destination)
+    if args.batch:
+        import atop_batch
+        processes, records = atop_batch.parse_processes(args.batch, args.workers, args.memory_limit << 20,
+                                                        args.native)
+    else:
+        try:
+            processes, records = parse(args.atop, args.native)
+        except ProcessParseError as e:
+            LOGGER.critical(e)
+            exit(-1)
+    if args.store:
+        import process_store
+        with atop_profile.stage('store', len(records)):
+            process_store.save(processes, records, args.store)
+    if destination:
+        get_statistics(processes, records, destination, args.workers, args.format)
 
 
 def parse_args():
     import argparse
+    from atop_batch import DEFAULT_MEMORY_LIMIT
     parser = argparse.ArgumentParser()
-    parser.add_argument('-atop', help='path to the atop file', required=True)
-    parser.add_argument('-dest', help='path to resulting xml file', required=True)
-
-    return parser.parse_args()
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument('-atop', help='path to the atop file')
+    input_group.add_argument('-batch', help='directory or glob pattern of atop files (e.g. daily logs), '
+                                            'parsed in parallel and merged')
+    parser.add_argument('-dest', help='path to resulting xml file')
+    parser.add_argument('-format', help='format of -dest, by its extension by default (xlsx if unknown)',
+                        choices=['xlsx', 'csv', 'parquet'])
+    parser.add_argument('-store', help='path to a process store with all records, see process_store.py')
+    parser.add_argument('-workers', help='number of processes used to parse the files and compute the statistics',
+                        type=int, default=1)
+    parser.add_argument('-memory_limit', help='with -batch, estimated memory of the files parsed at once in MB',
+                        type=int, default=DEFAULT_MEMORY_LIMIT >> 20)
+    parser.add_argument('-native', help='decode the process data of the raw atop files without running atop '
+                                        '(falls back to atop for unsupported atop versions)', action='store_true')
+    parser.add_argument('-profile', help='path to a json file with the time and memory of each stage')
+    parser.add_argument('-profile_cprofile', help='with -profile, also capture cProfile statistics',
+                        action='store_true')
+    parser.add_argument('-profile_memory', help='with -profile, also trace memory allocations (slow)',
+                        action='store_true')
+
+    args = parser.parse_args()
+    if not args.dest and not args.store:
+        parser.error('at least one of -dest and -store is required')
+    return args
 
 
 if __name__ == '__main__':
-    import cProfile
-    #cProfile.run('
-    main(parse_args())
+    args = parse_args()
+    if args.profile:
+        atop_profile.start(args.profile_cprofile, args.profile_memory)
+    try:
+        main(args)
+    finally:
+        if args.profile:
+            atop_profile.write(args.profile)
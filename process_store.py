@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import atop_time
+from atop_constants import *
+from atop_resource import AtopResource
+from report_format import load_array, save_array, save_frame
+
+LOGGER = logging.getLogger()
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+# Store of the parsed process records (see process_info), queried without parsing the atop files again.
+# A directory with a JSON manifest and one .npy file per column (like report_format), memory mapped on load:
+# - processes: one row per process (process id, pid, name, command, start, end, tgid), end is 0 if unknown
+# - records: one row per process and sample with the fields of all labels (NaN if missing), sorted by time,
+#   so a time slice is found by bisection
+# - by_process: rows of the records sorted by process and time, the rows of process id p are
+#   records[by_process[offsets[p]:offsets[p + 1]]]
+# - samples: distinct times of the records
+FORMAT = 'atopvis-processes'
+VERSION = 1
+MANIFEST = 'manifest.json'
+PROCESS_ID = 'process'
+AGGREGATIONS = ['sum', 'mean', 'max', 'min', 'count']
+
+
+class ProcessStoreError(Exception):
+    pass
+
+
+def save(processes, records, path):
+    # processes and records of process_info.parse (or merge)
+    os.makedirs(path, exist_ok=True)
+    info = pd.DataFrame([p.to_dict() for p in processes.values()])
+    info.insert(0, PROCESS_ID, np.array(list(processes), dtype=np.int64))
+    info['end'] = info['end'].fillna(0).astype(np.int64)
+    df = records.to_frame().sort_values(['epoch', PROCESS_ID], kind='stable', ignore_index=True)
+    ids = df[PROCESS_ID].to_numpy()
+    by_process = np.lexsort((df['epoch'].to_numpy(), ids))
+    counts = np.bincount(ids, minlength=info[PROCESS_ID].max() + 1 if len(info) else 0)
+    manifest = {'format': FORMAT, 'version': VERSION,
+                'processes': save_frame(path, 'processes', info),
+                'records': save_frame(path, 'records', df),
+                'by_process': save_array(path, 'by_process', by_process),
+                'offsets': save_array(path, 'offsets', np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)),
+                'samples': save_array(path, 'samples', np.unique(df['epoch'].to_numpy()))}
+    # manifest goes last, a store without it is incomplete
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    LOGGER.info(f'Stored {len(info)} processes with {len(df)} records to {path}')
+
+
+class ProcessStore:
+    def __init__(self, path):
+        try:
+            with open(os.path.join(path, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ProcessStoreError(f'{path} is not a valid process store: {e}')
+        if manifest.get('format') != FORMAT or manifest.get('version', 0) != VERSION:
+            raise ProcessStoreError(f'{path} has unsupported format {manifest.get("format")} '
+                                    f'version {manifest.get("version")}')
+        # processes are few, the records stay memory mapped
+        self.processes = pd.DataFrame({c: np.asarray(load_array(path, file)) for c, file in manifest['processes']})
+        self.columns = {c: load_array(path, file) for c, file in manifest['records']}
+        self.fields = [c for c in self.columns if c not in (PROCESS_ID, 'epoch')]
+        self.by_process = load_array(path, manifest['by_process'])
+        self.offsets = load_array(path, manifest['offsets'])
+        self.samples = load_array(path, manifest['samples'])
+
+    def find(self, name=None, pid=None, process=None, command=None):
+        # ids of the processes matching all given values (a value or a list of them), a substring of the command
+        mask = np.ones(len(self.processes), dtype=bool)
+        for column, values in (('name', name), ('pid', pid), (PROCESS_ID, process)):
+            if values is not None:
+                mask &= self.processes[column].isin(np.atleast_1d(values)).to_numpy()
+        if command is not None:
+            mask &= self.processes['command'].str.contains(command, regex=False).to_numpy()
+        return self.processes[PROCESS_ID].to_numpy()[mask]
+
+    def get_rows(self, processes=None, begin=None, end=None):
+        # rows of the records (in the order of time) of the given process ids, with begin <= time <= end
+        epoch = self.columns['epoch']
+        begin = -np.inf if begin is None else begin
+        end = np.inf if end is None else end
+        if processes is None:
+            return np.arange(np.searchsorted(epoch, begin, 'left'), np.searchsorted(epoch, end, 'right'))
+        processes = np.asarray(processes, dtype=np.int64)
+        starts, stops = self.offsets[processes], self.offsets[processes + 1]
+        lengths = stops - starts
+        # concatenated ranges starts[i]:stops[i]
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        rows = np.sort(self.by_process[positions])
+        times = epoch[rows]
+        return rows[(times >= begin) & (times <= end)]
+
+    def select(self, name=None, pid=None, process=None, command=None, begin=None, end=None, fields=None):
+        # records of the matching processes, with their pid and name
+        filtered = any(v is not None for v in (name, pid, process, command))
+        rows = self.get_rows(self.find(name, pid, process, command) if filtered else None, begin, end)
+        fields = self.fields if fields is None else fields
+        df = pd.DataFrame({c: self.columns[c][rows] for c in [PROCESS_ID, 'epoch'] + fields})
+        info = self.processes.set_index(PROCESS_ID)
+        df.insert(1, 'pid', info['pid'].reindex(df[PROCESS_ID]).to_numpy())
+        df.insert(2, 'name', info['name'].reindex(df[PROCESS_ID]).to_numpy())
+        return df
+
+    def aggregate(self, df, by='name', agg='sum', interval=None):
+        # per group and sample (or interval of seconds), e.g. the total memory of all processes of a name
+        fields = [c for c in df.columns if c in self.fields]
+        if interval:
+            df = df.assign(epoch=df['epoch'] // interval * interval)
+            # the value of a process in an interval is its mean over the samples, then it is aggregated
+            keys = list(dict.fromkeys([PROCESS_ID, by, 'epoch']))
+            df = df.groupby(keys, sort=False)[fields].mean().reset_index()
+        return df.groupby([by, 'epoch'])[fields].agg(agg).reset_index()
+
+    def to_resource(self, names, field, agg='sum', begin=None, end=None):
+        # time series of each of the names for MatplotlibPlotter, values of a name are aggregated by agg
+        df = self.select(name=names, begin=begin, end=end, fields=self.__get_source_fields(field))
+        values, unit = self.__get_values(df, field)
+        series = df.assign(value=values).groupby(['epoch', 'name'])['value'].agg(agg).unstack('name')
+        # all samples of the time range, processes not running have no value
+        samples = self.samples[(self.samples >= series.index.min()) & (self.samples <= series.index.max())] \
+            if len(series) else self.samples[:0]
+        series = series.reindex(samples).reindex(columns=list(np.atleast_1d(names))).fillna(0)
+        series.index.name = ATOP_TIMESTAMP
+        data = series.rename_axis(None, axis=1).reset_index()
+        title = ', '.join(np.atleast_1d(names))
+        return AtopResource(f'processes: {title}', unit, data, desc=f'{agg} of {field} of the processes')
+
+    @staticmethod
+    def __get_source_fields(field):
+        if field == 'cpu':
+            return ['clock-ticks', 'cpu-usr', 'cpu-sys']
+        if field in ('cpu-usr', 'cpu-sys'):
+            return ['clock-ticks', field]
+        return [field]
+
+    def __get_values(self, df, field):
+        # values of a field in the units of the plot
+        if 'kbytes' in field or field.endswith('-kb'):
+            return df[field] / 1024, 'MB'
+        if field.startswith('cpu'):
+            # clock ticks of the interval to % of a core, the interval of a sample ends at its time
+            ticks = df['cpu-usr'] + df['cpu-sys'] if field == 'cpu' else df[field]
+            i = np.searchsorted(self.samples, df['epoch'].to_numpy())
+            intervals = np.diff(self.samples, prepend=self.samples[0] - np.median(np.diff(self.samples))
+                                if len(self.samples) > 1 else 1)[i]
+            return ticks / df['clock-ticks'] / intervals * 100, '% of a core'
+        return df[field], field
+
+
+def parse_time(value, first):
+    # epoch, 'YYYY-MM-DD HH:MM[:SS]' or 'HH:MM[:SS]' on the day of the first sample, in local time
+    if value.isdigit():
+        return int(value)
+    day, _, clock = value.strip().rpartition(' ')
+    if day:
+        year, month, day = (int(v) for v in day.split('-'))
+    else:
+        t = time.localtime(first)
+        year, month, day = t.tm_year, t.tm_mon, t.tm_mday
+    hours, minutes, seconds = ([int(v) for v in clock.split(':')] + [0])[:3]
+    local = atop_time.day_to_local(year, month, day) + hours * 3600 + minutes * 60 + seconds
+    return int(atop_time.local_to_epoch(local))
+
+
+def main(args):
+    start = time.perf_counter()
+    store = ProcessStore(args.store)
+    if args.list:
+        df = store.processes if args.name is None else store.processes[store.processes['name'].isin(args.name)]
+    else:
+        first = int(store.samples[0]) if len(store.samples) else 0
+        begin = parse_time(args.begin, first) if args.begin else None
+        end = parse_time(args.end, first) if args.end else None
+        df = store.select(args.name, args.pid, args.process, args.command, begin, end, args.fields)
+        if args.agg:
+            df = store.aggregate(df, args.by, args.agg, args.interval)
+        df.insert(df.columns.get_loc('epoch') + 1, 'time',
+                  [atop_time.format_time(t, '%Y-%m-%d %H:%M:%S') for t in df['epoch'].tolist()])
+    LOGGER.info(f'{len(df)} rows in {(time.perf_counter() - start) * 1000:.1f} ms')
+    if args.dest:
+        df.to_csv(args.dest, index=False)
+    else:
+        with pd.option_context('display.max_rows', args.max_rows, 'display.width', None):
+            print(df)
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='query the process records stored by process_info.py -store')
+    parser.add_argument('-store', help='path to the process store', required=True)
+    parser.add_argument('-list', help='list the (matching) processes instead of their records', action='store_true')
+    parser.add_argument('-name', help='names of the processes', nargs='+')
+    parser.add_argument('-pid', help='pids of the processes', type=int, nargs='+')
+    parser.add_argument('-process', help='ids of the processes (unique in the store)', type=int, nargs='+')
+    parser.add_argument('-command', help='substring of the command of the processes')
+    parser.add_argument('-begin', help='epoch, YYYY-MM-DD HH:MM[:SS] or HH:MM[:SS] on the first day (local time)')
+    parser.add_argument('-end', help='epoch, YYYY-MM-DD HH:MM[:SS] or HH:MM[:SS] on the first day (local time)')
+    parser.add_argument('-fields', help='fields of the records, all by default', nargs='+')
+    parser.add_argument('-agg', help='aggregate the records of each group and sample', choices=AGGREGATIONS)
+    parser.add_argument('-by', help='with -agg, the groups', choices=['name', 'pid', PROCESS_ID], default='name')
+    parser.add_argument('-interval', help='with -agg, aggregate over intervals of seconds instead of samples',
+                        type=int)
+    parser.add_argument('-dest', help='path to a csv file with the result, printed if not set')
+    parser.add_argument('-max_rows', help='rows printed at most', type=int, default=60)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
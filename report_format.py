@@ -0,0 +1,141 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from atop_processes import AtopProcesses
+from atop_report import AtopReport
+from atop_resource import AtopResource
+
+# Report stored as a directory: a JSON manifest plus one .npy file per column.
+# Columns are memory mapped on load and a resource's DataFrames are only built when the resource is used.
+# Only plain numbers and strings are stored, so no pickled code is ever executed when loading.
+FORMAT = 'atopvis-report'
+VERSION = 4
+MANIFEST = 'manifest.json'
+
+
+class ReportFormatError(Exception):
+    pass
+
+
+class MappedResource(AtopResource):
+    # Resource whose frames are loaded on first access. AtopResource.__init__ is not called, it would assign the
+    # frames through the properties below, which are set only when a loaded frame is replaced (e.g. by an update).
+    def __init__(self, path, name, unit, data, data_opt, data_opt_unit, desc):
+        self.name = name
+        self.unit = unit
+        self.data_opt_unit = data_opt_unit
+        self.desc = desc
+        self.__path = path
+        self.__columns = {'data': data, 'data_opt': data_opt}
+        self.__frames = {}  # nothing loaded yet
+
+    def __get(self, key):
+        if key not in self.__frames:
+            self.__frames[key] = load_frame(self.__path, self.__columns[key])
+        return self.__frames[key]
+
+    @property
+    def data(self):
+        return self.__get('data')
+
+    @data.setter
+    def data(self, value):
+        self.__frames['data'] = value
+
+    @property
+    def data_opt(self):
+        return self.__get('data_opt')
+
+    @data_opt.setter
+    def data_opt(self, value):
+        self.__frames['data_opt'] = value
+
+    def __reduce__(self):
+        # pickle as a plain, fully loaded resource
+        return AtopResource, (self.name, self.unit, self.data, self.data_opt, self.data_opt_unit, self.desc)
+
+
+def save_frame(path, prefix, df):
+    if df is None:
+        return None
+    columns = []
+    for i, (c, values) in enumerate(df.items()):
+        file = f'{prefix}_{i}.npy'
+        values = values.to_numpy()
+        if values.dtype.kind not in 'biuf':
+            values = values.astype(str)
+        np.save(os.path.join(path, file), values, allow_pickle=False)
+        columns.append([c, file])
+    return columns
+
+
+def save_array(path, name, values):
+    file = f'{name}.npy'
+    np.save(os.path.join(path, file), values, allow_pickle=False)
+    return file
+
+
+def save_processes(path, processes):
+    # the table as it is kept (sorted), with the codes of the categorical columns and their categories apart,
+    # so loading it converts and sorts nothing
+    df, categories = processes.to_codes()
+    return {'columns': save_frame(path, 'processes', df),
+            'categories': {c: save_array(path, f'processes_{c}', values.astype(str)) for c, values in categories.items()}}
+
+
+def load_processes(path, processes):
+    columns = {c: load_array(path, file) for c, file in processes['columns']}
+    categories = {c: load_array(path, file) for c, file in processes['categories'].items()}
+    return AtopProcesses.from_codes(columns, categories)
+
+
+def load_array(path, file):
+    return np.load(os.path.join(path, file), mmap_mode='r', allow_pickle=False)
+
+
+def load_frame(path, columns):
+    if columns is None:
+        return None
+    # without copy=False the columns would be copied into blocks, i.e. read to memory at once.
+    # Numeric columns stay memory mapped and read-only, strings are converted on load.
+    return pd.DataFrame({c: load_array(path, file) for c, file in columns}, copy=False)
+
+
+def save(report, path):
+    os.makedirs(path, exist_ok=True)
+    resources = []
+    for i, r in enumerate(report.resources):
+        resources.append({'name': r.name, 'unit': r.unit, 'desc': r.desc, 'data_opt_unit': r.data_opt_unit,
+                          'data': save_frame(path, f'r{i}_data', r.data),
+                          'data_opt': save_frame(path, f'r{i}_data_opt', r.data_opt)})
+    manifest = {'format': FORMAT, 'version': VERSION, 'file': report.file,
+                'resources': resources, 'processes': save_processes(path, report.processes)}
+    # manifest goes last, a report without it is incomplete
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ReportFormatError(f'{path} is not a valid report: {e}')
+    # older versions have local times of the day instead of epoch timestamps, the processes as text or sorted
+    # on load
+    if manifest.get('format') != FORMAT or manifest.get('version', 0) != VERSION:
+        raise ReportFormatError(f'{path} has unsupported format {manifest.get("format")} '
+                                f'version {manifest.get("version")}')
+    report = AtopReport.__new__(AtopReport)  # nothing to parse
+    report.file = manifest['file']
+    report.workers = 1
+    report.timeline = None
+    report.resources = [MappedResource(path, r['name'], r['unit'], r['data'], r['data_opt'], r['data_opt_unit'],
+                                       r['desc']) for r in manifest['resources']]
+    report.processes = load_processes(path, manifest['processes'])
+    return report
+
+
+def is_report(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
@@ -1,56 +1,115 @@
+from bisect import bisect_right
+import heapq
+import numpy as np
+import pandas as pd
+import atop_time
 
-class ScipionTimeline:
-    from csv import DictReader
-    from datetime import timedelta, datetime
-    import matplotlib.dates as mdates
 
+class IntervalIndex:
+    # Static centered interval tree, finds all intervals containing a point in O(log n + k).
+    # Node: (center, left node, right node, intervals containing center sorted by start, the same sorted by end)
+    def __init__(self, intervals):
+        # intervals: [(start, end, item)...]
+        self.root = self.__build(list(intervals))
+
+    @staticmethod
+    def __build(intervals):
+        if not intervals:
+            return None
+        points = sorted(p for i in intervals for p in i[:2])
+        center = points[len(points) // 2]
+        left = [i for i in intervals if i[1] < center]
+        right = [i for i in intervals if i[0] > center]
+        here = [i for i in intervals if i[0] <= center <= i[1]]
+        return (center, IntervalIndex.__build(left), IntervalIndex.__build(right),
+                sorted(here, key=lambda i: i[0]), sorted(here, key=lambda i: i[1], reverse=True))
+
+    def query(self, point):
+        result = []
+        node = self.root
+        while node is not None:
+            center, left, right, by_start, by_end = node
+            if point < center:
+                for i in by_start:
+                    if i[0] > point:
+                        break
+                    result.append(i[2])
+                node = left
+            elif point > center:
+                for i in by_end:
+                    if i[1] < point:
+                        break
+                    result.append(i[2])
+                node = right
+            else:
+                result.extend(i[2] for i in by_start)
+                break
+        return result
+
+
+class ScipionTimeline:
     def __init__(self, file):
         self.file = file
-        self.timeline = {}  # {1: [(n, (s, d))...]} == y_value: [(protocol, (start, length))...]
+        self.timeline = {}  # {1: [(n, (s, d))...]} == y_value: [(protocol, (start epoch, length in seconds))...], int64 seconds
+        self.lane_starts = {}  # y_value: [start...], sorted, routines of a lane never overlap
+        self.index = None
         self.__parse()
+        self.__create_index()
+
+    def __create_index(self):
+        intervals = []
+        for lane, routines in sorted(self.timeline.items()):
+            self.lane_starts[lane] = [r[1][0] for r in routines]
+            for i, (n, (s, d)) in enumerate(routines):
+                # keep the order of the lanes in the results
+                intervals.append((s, s + d, (lane, i)))
+        self.index = IntervalIndex(intervals)
+
+    def __get_routine(self, lane, i):
+        n, (s, d) = self.timeline[lane][i]
+        return n, s, s + d, d
+
+    def get_running_routines(self, time):
+        # [(name, start, end, duration)...] of all routines running at time (epoch)
+        return [self.__get_routine(*k) for k in sorted(self.index.query(time))]
+
+    def get_lane_routines(self, time, lane):
+        # [(name, start, end, duration)] of the routine running at time in the lane, or empty list
+        starts = self.lane_starts.get(lane)
+        if not starts:
+            return []
+        i = bisect_right(starts, time) - 1
+        if i < 0:
+            return []
+        routine = self.__get_routine(lane, i)
+        return [routine] if time <= routine[2] else []
 
     def __parse(self):
-        def fix_time(t):
-            return self.datetime.combine(self.datetime.now().date(), t.time())
-        tmp = []
-        # load data to dictionary
-        keys = ['protocol_name', 'protocol_start', 'protocol_end']
-        with open(self.file) as f:
-            reader = self.DictReader(f, delimiter=';')
-            for line in reader:
-                # we need to hack the time, because the rest of the timeline uses only time
-                # which automatically sets day to the day of processing
-                d = {'name': line['protocol_name'],
-                     's': fix_time(self.datetime.strptime(line['protocol_start'], '%Y-%m-%d %H:%M:%S,%f')),
-                     'e': fix_time(self.datetime.strptime(line['protocol_end'], '%Y-%m-%d %H:%M:%S,%f'))}
-                tmp.append(d)
-        tmp = self.__remove_duplicates(tmp)
-        self.__create_timeline(tmp)
+        df = pd.read_csv(self.file, sep=';', usecols=['protocol_name', 'protocol_start', 'protocol_end'],
+                         dtype=str, keep_default_na=False)
+        data = pd.DataFrame({'name': df['protocol_name']})
+        for c, k in (('protocol_start', 's'), ('protocol_end', 'e')):
+            # local time
+            data[k] = pd.to_datetime(df[c], format='%Y-%m-%d %H:%M:%S,%f')
+        data = data.drop_duplicates().sort_values('s', kind='stable')
+        self.__create_timeline(data)
 
     def __create_timeline(self, data):
-        end_times = {}
-        # find the first 'empty slot'
-        for d in sorted(data, key=lambda x: x['s']):
-            s = d['s']
-            e = d['e']
-            n = d['name']
-            sn = self.mdates.date2num(s)
-            en = self.mdates.date2num(e)
-            l = en - sn
-            for i in range(0, 10000):
-                # this timeslot is currently not occupied
-                if end_times.get(i) is None or end_times[i] <= s:
-                    end_times[i] = e + self.timedelta(seconds=10)
-                    self.timeline.setdefault(i, []).append((n, (sn, l)))
-                    break
-
-    @staticmethod
-    def __remove_duplicates(data):
-        result = []
-        seen = set()
-        for d in data:
-            t = tuple(sorted(d.items()))
-            if t not in seen:
-                seen.add(t)
-                result.append(d)
-        return result
+        names = data['name'].tolist()
+        # int64 epoch seconds, converted once: the start rounded down and the end up, so a routine covers every
+        # second it was running in
+        ns = np.int64(10 ** 9)
+        starts = atop_time.local_to_epoch(data['s'].to_numpy(dtype='datetime64[ns]').view(np.int64) // ns)
+        ends = atop_time.local_to_epoch(-(-data['e'].to_numpy(dtype='datetime64[ns]').view(np.int64) // ns))
+        ls = ends - starts
+        # a lane is free again 10 seconds after its last routine ended
+        free_at = (ends + 10).tolist()
+        busy = []  # heap of (time when free, lane)
+        free = []  # heap of free lanes
+        for n, s, f, l in zip(names, starts.tolist(), free_at, ls.tolist()):
+            while busy and busy[0][0] <= s:
+                heapq.heappush(free, heapq.heappop(busy)[1])
+            # take the first 'empty slot'
+            lane = heapq.heappop(free) if free else len(self.timeline)
+            heapq.heappush(busy, (f, lane))
+            self.timeline.setdefault(lane, []).append((n, (s, l)))
@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, ROOT)
+import generate
+import process_info
+
+INTERVAL = 10
+PID = 500
+
+
+def get_sample(epoch, start, state, cpu):
+    return {'epoch': epoch, 'pids': [PID], 'names': ['java'], 'starts': [start], 'states': [state],
+            'prc': np.array([[cpu, 0, 0, 0]]), 'prm': np.zeros((1, 8), dtype=np.int64),
+            'growth': np.zeros((1, 2), dtype=np.int64), 'prd': np.zeros((1, 3), dtype=np.int64),
+            'pre': np.zeros((1, 4), dtype=np.int64)}
+
+
+class PidReuseTest(unittest.TestCase):
+    # one pid runs two processes in sequence, the second one starts after the first one ended
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        first, second = generate.EPOCH - 100, generate.EPOCH + 2 * INTERVAL
+        samples = [get_sample(generate.EPOCH, first, 'S', 1),  # since boot, skipped
+                   get_sample(generate.EPOCH + INTERVAL, first, 'E', 10),
+                   get_sample(second, second, 'S', 20),
+                   get_sample(generate.EPOCH + 3 * INTERVAL, second, 'S', 30)]
+        lines = ['RESET']
+        with open(os.path.join(self.directory, 'atop.raw'), 'wb') as raw:
+            raw.write(generate.get_raw_header())
+            for sample in samples:
+                raw.write(generate.get_raw_sample(sample, INTERVAL))
+                lines.extend(generate.get_process_lines(sample, INTERVAL))
+        generate.write_lines(os.path.join(self.directory, 'atop_P.txt'), lines)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = os.path.join(ROOT, 'benchmarks', 'bin') + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        self.tmp.cleanup()
+
+    def check(self, processes, records):
+        self.assertEqual(len(processes), 2)
+        (a, first), (b, second) = sorted(processes.items(), key=lambda p: p[1].start)
+        self.assertNotEqual(a, b)
+        self.assertEqual((first.pid, first.end), (PID, generate.EPOCH + INTERVAL))
+        self.assertEqual((second.pid, second.start, second.end), (PID, generate.EPOCH + 2 * INTERVAL, None))
+        df = pd.concat(list(process_info.iter_statistics(processes, records)), ignore_index=True)
+        stats = df.set_index('start')['cpu-usr-sum']
+        self.assertEqual(stats[first.start], 10)
+        self.assertEqual(stats[second.start], 50)
+
+    def test_atop(self):
+        self.check(*process_info.parse(self.directory))
+
+    def test_native(self):
+        self.check(*process_info.parse(os.path.join(self.directory, 'atop.raw'), native=True))
+
+
+if __name__ == '__main__':
+    unittest.main()